@@ -0,0 +1,15 @@
+import bcrypt
+
+# Kept free of app imports: these run inside the hashing worker processes
+
+def hash_password(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def check_password(password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+def hash_passwords(passwords: list, rounds: int) -> list:
+    return [hash_password(p, rounds) for p in passwords]
+
+def check_passwords(pairs: list) -> list:
+    return [check_password(p, h) for p, h in pairs]
@@ -1,12 +1,20 @@
 import os
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import time
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
-import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from database import get_db
-from models.user import User
+from database import AsyncSessionLocal
+from sqlalchemy import select
+from models.user import User, RoleEnum
+from models.teacher import Teacher
+from models.student import Student
+from auth.hashing import hash_password, check_password, hash_passwords, check_passwords
+from auth.principal_cache import Principal, PRINCIPAL_CACHE_TTL, token_cache, principal_cache
+from services import metrics
 
 # JWT Config
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
@@ -17,11 +25,105 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
 # OAuth2 scheme for token extraction
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Password hashing config
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", str(os.cpu_count() or 2)))
+# Requests waiting for a hashing worker beyond this are rejected with 503
+HASH_POOL_MAX_PENDING = int(os.getenv("HASH_POOL_MAX_PENDING", "256"))
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded process pool so it never occupies request threads.
+
+    Single hashes/checks from request handlers fail fast with 503 once
+    max_pending jobs are queued; bulk jobs (imports, backfills) wait for room.
+    """
+
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._pool = None
+        self._cond = threading.Condition()
+
+    def _executor(self):
+        if self._pool is None:
+            with self._cond:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def _submit(self, fn, *args, wait: bool = False):
+        with self._cond:
+            if wait:
+                self._cond.wait_for(lambda: self.pending < self.max_pending)
+            elif self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy, please retry"
+                )
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+        future = self._executor().submit(fn, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, _future):
+        with self._cond:
+            self.pending -= 1
+            self.completed += 1
+            self._cond.notify()
+
+    # Timers include time queued for a worker, which is what callers wait for
+    async def hash(self, password: str) -> str:
+        with metrics.timer("bcrypt_hash"):
+            return await asyncio.wrap_future(self._submit(hash_password, password, self.rounds))
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        with metrics.timer("bcrypt_verify"):
+            return await asyncio.wrap_future(self._submit(check_password, plain_password, hashed_password))
+
+    def hash_sync(self, password: str) -> str:
+        with metrics.timer("bcrypt_hash"):
+            return self._submit(hash_password, password, self.rounds, wait=True).result()
+
+    def _slices(self, items: list):
+        # A few slices per worker keeps every process busy without per-item IPC
+        size = max(1, -(-len(items) // (self.workers * 4)))
+        return [items[i:i + size] for i in range(0, len(items), size)]
+
+    @metrics.timed("bcrypt_hash_batch")
+    def hash_many(self, passwords: list) -> list:
+        futures = [self._submit(hash_passwords, part, self.rounds, wait=True) for part in self._slices(passwords)]
+        return [h for f in futures for h in f.result()]
+
+    @metrics.timed("bcrypt_verify_batch")
+    def verify_many(self, pairs: list) -> list:
+        futures = [self._submit(check_passwords, part, wait=True) for part in self._slices(pairs)]
+        return [ok for f in futures for ok in f.result()]
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "pending": self.pending,
+                "peak_pending": self.peak_pending,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "rejected": self.rejected
+            }
+
+password_hasher = PasswordHasher(HASH_POOL_WORKERS, HASH_POOL_MAX_PENDING, BCRYPT_ROUNDS)
+
 def verify_password(plain_password, hashed_password):
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    return check_password(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return hash_password(password, BCRYPT_ROUNDS)
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -34,13 +136,46 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return encoded_jwt
 
 def decode_token(token: str):
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         return None
+    # Never trust a cached token past its own expiry
+    ttl = min(PRINCIPAL_CACHE_TTL, payload.get("exp", 0) - time.time())
+    if ttl > 0:
+        token_cache.set(token, payload, ttl)
+    return payload
+
+async def load_principal(user_id: int, claims: dict):
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async with AsyncSessionLocal() as db:
+        user = await db.get(User, user_id)
+        if user is None:
+            return None
+        # Tokens carry the caller's teacher/student id; only older tokens need the lookup
+        teacher_id = student_id = None
+        if user.role == RoleEnum.teacher:
+            teacher_id = claims.get("teacher_id") or await db.scalar(select(Teacher.id).where(Teacher.user_id == user.id))
+        elif user.role == RoleEnum.student:
+            student_id = claims.get("student_id") or await db.scalar(select(Student.id).where(Student.user_id == user.id))
+    principal = Principal(user.id, user.role, user.school_id, bool(user.is_active), teacher_id, student_id)
+    principal_cache.set(user_id, principal, PRINCIPAL_CACHE_TTL)
+    return principal
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    """The authenticated caller as a Principal.
+
+    Carries id, role, school_id and is_active from the users row plus the
+    caller's own teacher_id (teachers) or student_id (students), so routes
+    never need to look those up. Served from a short-lived cache; routes
+    that need other user columns load the row themselves.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -50,14 +185,12 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     if payload is None:
         raise credentials_exception
     
-    user_id = payload.get("sub")
-    role = payload.get("role")
-    school_id = payload.get("school_id")
-    
-    if user_id is None:
+    try:
+        user_id = int(payload.get("sub"))
+    except (TypeError, ValueError):
         raise credentials_exception
-        
-    user = db.query(User).filter(User.id == user_id).first()
+
+    user = await load_principal(user_id, payload)
     if user is None:
         raise credentials_exception
     
@@ -66,7 +199,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         
     return user
 
-def check_role(user: User, allowed_roles: list):
+def check_role(user: Principal, allowed_roles: list):
     if user.role not in allowed_roles:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
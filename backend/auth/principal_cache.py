@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# How long (seconds) a verified token / user principal is trusted without
+# going back to the database. Writes in this worker invalidate immediately;
+# the TTL bounds how long a deactivation made on another worker can lag.
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+# The user fields routes rely on for authorization, plus the caller's own
+# teachers.id / students.id row; anything else is loaded on demand
+Principal = namedtuple("Principal", ["id", "role", "school_id", "is_active", "teacher_id", "student_id"])
+
+class TTLCache:
+    """Thread-safe LRU map whose entries also expire after a deadline."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def pop_where(self, predicate):
+        with self._lock:
+            for key in [k for k, (_, v) in self._data.items() if predicate(v)]:
+                del self._data[key]
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._data), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+# token -> decoded claims (skips signature checks for tokens seen recently)
+token_cache = TTLCache(PRINCIPAL_CACHE_SIZE)
+# user id -> Principal (skips the users lookup)
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE)
+
+def invalidate_user(user_id: int):
+    principal_cache.pop(int(user_id))
+
+def invalidate_school(school_id: int):
+    principal_cache.pop_where(lambda p: p.school_id == school_id)
@@ -0,0 +1,25 @@
+from database import SessionLocal
+from models.user import User
+from auth.jwt_handler import password_hasher
+
+# One-off: users.is_default_password used to be computed on every /auth/me call
+# by checking the password against the user's name. Store that result once.
+def backfill_default_password():
+    db = SessionLocal()
+    try:
+        users = db.query(User.id, User.name, User.password_hash).all()
+        print(f"Checking {len(users)} users...")
+
+        results = password_hasher.verify_many([(u.name, u.password_hash) for u in users])
+
+        changed = 0
+        for u, is_default in zip(users, results):
+            changed += db.query(User).filter(User.id == u.id, User.is_default_password != is_default)\
+                .update({"is_default_password": is_default}, synchronize_session=False)
+        db.commit()
+        print(f"✅ Updated {changed} users")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    backfill_default_password()
@@ -0,0 +1,380 @@
+import os
+
+# Never point the benchmark at the dev database by accident: it gets its own
+# URL (a local SQLite file by default) before database.py reads DATABASE_URL
+os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL", "sqlite:///./bench.db")
+os.environ.pop("ASYNC_DATABASE_URL", None)
+# Per-request SQL counts come back in the X-DB-* response headers
+os.environ.setdefault("SQL_DEBUG_HEADERS", "1")
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+import httpx
+from sqlalchemy import insert, select, func
+from database import Base, SessionLocal, engine
+from models.user import User, RoleEnum
+from models.school import School
+from models.teacher import Teacher
+from models.student import Student
+from models.subject import Subject
+from models.marks import Marks
+from auth.hashing import hash_password
+from auth.jwt_handler import BCRYPT_ROUNDS, create_access_token
+from services import school_stats, analytics
+import main
+
+# Load benchmark: seeds a synthetic dataset, drives role mixes against the app
+# concurrently and writes per-endpoint latency percentiles, throughput, SQL
+# query counts and DB time to a JSON report. Run from backend/:
+#   python bench.py                                  every scenario, default dataset
+#   python bench.py --students 100 --concurrency 50 student_storm
+#   python bench.py --out after.json --compare before.json
+# The database is BENCH_DATABASE_URL (default sqlite:///./bench.db). It is seeded
+# when empty and reused when it already holds a bench dataset; --fresh recreates
+# a SQLite file. By default requests go to the app in-process; --url sends them
+# to a running server instead (seed first, point the server at the same
+# database, and start it with SQL_DEBUG_HEADERS=1 to get query counts).
+
+BENCH_DOMAIN = "bench-school.com"
+BENCH_PASSWORD = "bench-pass"
+SUBJECT_NAMES = ["Mathematics", "Science", "English", "History", "Geography", "Physics", "Chemistry", "Biology"]
+
+def calculate_grade(total):
+    if total >= 90: return "A+"
+    elif total >= 80: return "A"
+    elif total >= 70: return "B"
+    elif total >= 60: return "C"
+    elif total >= 50: return "D"
+    else: return "F"
+
+def random_marks(rng):
+    mid, final, assignment = rng.randint(5, 40), rng.randint(5, 45), rng.randint(0, 15)
+    return {"mid_term": mid, "final_term": final, "assignment": assignment}
+
+def seed(args):
+    """Insert the synthetic dataset with explicit ids; the database must be empty."""
+    rng = random.Random(args.seed)
+    password_hash = hash_password(BENCH_PASSWORD, BCRYPT_ROUNDS)
+    users, schools, teachers, students, subjects, marks = [], [], [], [], [], []
+    user_id = teacher_id = student_id = subject_id = 0
+
+    def add_user(name, email, role, school_id):
+        nonlocal user_id
+        user_id += 1
+        users.append({"id": user_id, "name": name, "email": email, "password_hash": password_hash,
+                      "role": role, "school_id": school_id, "is_active": True, "is_default_password": False})
+        return user_id
+
+    add_user("Bench Root", f"root@{BENCH_DOMAIN}", RoleEnum.super_admin, None)
+    for s in range(1, args.schools + 1):
+        schools.append({"id": s, "name": f"Bench School {s}", "address": "Bench Road", "email": f"school{s}@{BENCH_DOMAIN}", "phone": "0000000000"})
+        add_user(f"Bench Admin {s}", f"admin{s}@{BENCH_DOMAIN}", RoleEnum.school_admin, s)
+        school_subjects = []
+        for name in (SUBJECT_NAMES * (args.subjects // len(SUBJECT_NAMES) + 1))[:args.subjects]:
+            subject_id += 1
+            subjects.append({"id": subject_id, "name": name, "school_id": s})
+            school_subjects.append(subject_id)
+        for t in range(1, args.teachers + 1):
+            teacher_id += 1
+            uid = add_user(f"Bench Teacher {s}-{t}", f"teacher{s}_{t}@{BENCH_DOMAIN}", RoleEnum.teacher, s)
+            teachers.append({"id": teacher_id, "user_id": uid, "school_id": s, "subject_specialization": SUBJECT_NAMES[t % len(SUBJECT_NAMES)]})
+            for k in range(1, args.students + 1):
+                student_id += 1
+                name = f"Bench Student {s}-{t}-{k}"
+                uid = add_user(name, f"student{s}_{t}_{k}@{BENCH_DOMAIN}", RoleEnum.student, s)
+                students.append({"id": student_id, "user_id": uid, "teacher_id": teacher_id, "school_id": s, "name": name,
+                                 "age": rng.randint(13, 17), "gender": rng.choice(["Male", "Female"]), "class_name": f"{9 + k % 4}th"})
+                for sub in school_subjects:
+                    m = random_marks(rng)
+                    total = m["mid_term"] + m["final_term"] + m["assignment"]
+                    marks.append({"student_id": student_id, "subject_id": sub, "school_id": s, **m, "total": total, "grade": calculate_grade(total)})
+
+    db = SessionLocal()
+    try:
+        # Parents before children for the foreign keys; schools.created_by stays NULL
+        for model, rows in ((School, schools), (User, users), (Subject, subjects), (Teacher, teachers), (Student, students), (Marks, marks)):
+            for i in range(0, len(rows), 5000):
+                db.execute(insert(model), rows[i:i + 5000])
+        db.commit()
+        school_stats.reconcile(db)
+        db.commit()
+        for s in range(1, args.schools + 1):
+            analytics.rebuild(db, s)
+            db.commit()
+    finally:
+        db.close()
+    print(f"✅ Seeded {len(schools)} schools, {len(teachers)} teachers, {len(students)} students, {len(marks)} marks")
+
+def prepare(args):
+    if args.fresh and engine.dialect.name == "sqlite" and engine.url.database:
+        engine.dispose()
+        if os.path.exists(engine.url.database):
+            os.remove(engine.url.database)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        existing = db.scalar(select(func.count(User.id)))
+        benched = db.scalar(select(func.count(User.id)).where(User.email == f"root@{BENCH_DOMAIN}"))
+    finally:
+        db.close()
+    if existing and not benched:
+        sys.exit("❌ BENCH_DATABASE_URL holds non-benchmark data; point it at an empty database")
+    if not existing:
+        seed(args)
+    else:
+        print("✅ Reusing the existing bench dataset (--fresh to reseed a SQLite file)")
+
+def load_actors():
+    """Every seeded user with a token carrying the same claims /login issues."""
+    db = SessionLocal()
+    try:
+        subjects = defaultdict(list)
+        for sid, school_id in db.execute(select(Subject.id, Subject.school_id)):
+            subjects[school_id].append(sid)
+        rows = db.execute(
+            select(User.id, User.email, User.role, User.school_id, Teacher.id.label("teacher_id"), Student.id.label("student_id"), Student.teacher_id.label("student_teacher"))
+            .outerjoin(Teacher, Teacher.user_id == User.id)
+            .outerjoin(Student, Student.user_id == User.id)
+            .where(User.email.like(f"%@{BENCH_DOMAIN}"))
+        ).all()
+    finally:
+        db.close()
+
+    roster = defaultdict(list)
+    for r in rows:
+        if r.student_id:
+            roster[r.student_teacher].append(r.student_id)
+    actors = defaultdict(list)
+    for r in rows:
+        teacher_id = r.teacher_id or r.student_teacher
+        token = create_access_token({"sub": str(r.id), "role": r.role.value, "school_id": r.school_id,
+                                     "teacher_id": teacher_id, "student_id": r.student_id})
+        actors[r.role.value].append({
+            "email": r.email,
+            "headers": {"Authorization": f"Bearer {token}"},
+            "students": roster.get(r.teacher_id, []),
+            "subjects": subjects.get(r.school_id, [])
+        })
+    return actors
+
+def marks_batch(actor, rng, size):
+    # A teacher entering one subject's marks for part of their class
+    subject_id = rng.choice(actor["subjects"])
+    chosen = rng.sample(actor["students"], min(size, len(actor["students"])))
+    return {"marks": [{"student_id": sid, "subject_id": subject_id, **random_marks(rng)} for sid in chosen]}
+
+# Scenario -> [(weight, role, endpoint label, request builder)]; builders return (method, path, json)
+STUDENT = [
+    (5, "student", "GET /api/student/my-dashboard", lambda a, rng, args: ("GET", "/api/student/my-dashboard", None)),
+    (3, "student", "GET /api/student/my-marks", lambda a, rng, args: ("GET", "/api/student/my-marks", None)),
+    (1, "student", "GET /api/student/my-prediction", lambda a, rng, args: ("GET", "/api/student/my-prediction", None)),
+    (1, "student", "GET /api/student/my-report-pdf", lambda a, rng, args: ("GET", "/api/student/my-report-pdf", None)),
+]
+TEACHER = [
+    (3, "teacher", "POST /api/teacher/add-marks", lambda a, rng, args: ("POST", "/api/teacher/add-marks", marks_batch(a, rng, args.batch))),
+    (1, "teacher", "GET /api/teacher/my-students", lambda a, rng, args: ("GET", "/api/teacher/my-students?limit=100", None)),
+    (1, "teacher", "GET /api/teacher/my-report", lambda a, rng, args: ("GET", "/api/teacher/my-report?limit=100", None)),
+]
+ADMIN = [
+    (4, "school_admin", "GET /api/school-admin/dashboard", lambda a, rng, args: ("GET", "/api/school-admin/dashboard", None)),
+    (2, "school_admin", "GET /api/school-admin/reports", lambda a, rng, args: ("GET", "/api/school-admin/reports?limit=100", None)),
+    (2, "school_admin", "GET /api/ml/school-insights", lambda a, rng, args: ("GET", "/api/ml/school-insights", None)),
+    (1, "school_admin", "GET /api/ml/clusters", lambda a, rng, args: ("GET", "/api/ml/clusters", None)),
+    (1, "school_admin", "GET /api/marks/subject-average", lambda a, rng, args: ("GET", "/api/marks/subject-average", None)),
+]
+LOGIN = [
+    (1, "any", "POST /api/auth/login", lambda a, rng, args: ("POST", "/api/auth/login", {"email": a["email"], "password": BENCH_PASSWORD})),
+]
+
+def _scaled(mix, factor):
+    return [(weight * factor, *rest) for weight, *rest in mix]
+
+SCENARIOS = {
+    "student_storm": STUDENT,
+    "teacher_marks": TEACHER,
+    "admin_dashboards": ADMIN,
+    "logins": LOGIN,
+    # Roughly a school day: mostly students, some marks entry, a few admins and logins
+    "mixed": _scaled(STUDENT, 7) + _scaled(TEACHER, 3) + _scaled(ADMIN, 2) + _scaled(LOGIN, 2),
+}
+
+def percentile(values: list, p: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))]
+
+def summarize(samples: dict, elapsed: float) -> dict:
+    endpoints = {}
+    for label, s in sorted(samples.items()):
+        latencies = s["latencies"]
+        endpoints[label] = {
+            "requests": len(latencies),
+            "errors": sum(n for code, n in s["status"].items() if code >= 400),
+            "status": {str(code): n for code, n in sorted(s["status"].items())},
+            "throughput_rps": round(len(latencies) / elapsed, 2),
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies), 2),
+                "p50": round(percentile(latencies, 50), 2),
+                "p95": round(percentile(latencies, 95), 2),
+                "p99": round(percentile(latencies, 99), 2),
+                "max": round(max(latencies), 2)
+            },
+            "queries": {
+                "mean": round(sum(s["queries"]) / len(s["queries"]), 2),
+                "p95": percentile(s["queries"], 95),
+                "max": max(s["queries"])
+            } if s["queries"] else None,
+            "db_time_ms": {
+                "mean": round(sum(s["db_ms"]) / len(s["db_ms"]), 2),
+                "p95": round(percentile(s["db_ms"], 95), 2)
+            } if s["db_ms"] else None
+        }
+    total = sum(e["requests"] for e in endpoints.values())
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "requests": total,
+        "errors": sum(e["errors"] for e in endpoints.values()),
+        "throughput_rps": round(total / elapsed, 2),
+        "endpoints": endpoints
+    }
+
+async def run_scenario(name: str, actors: dict, args) -> dict:
+    mix = SCENARIOS[name]
+    weights = [w for w, *_ in mix]
+    everyone = [a for group in actors.values() for a in group]
+    samples = defaultdict(lambda: {"latencies": [], "status": Counter(), "queries": [], "db_ms": []})
+    if args.url:
+        transport = httpx.AsyncHTTPTransport()
+        base_url = args.url
+    else:
+        transport = httpx.ASGITransport(app=main.app)
+        base_url = "http://bench"
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout) as client:
+        deadline = time.perf_counter() + args.duration
+
+        async def virtual_user(worker: int):
+            rng = random.Random(f"{args.seed}-{name}-{worker}")
+            while time.perf_counter() < deadline:
+                weight, role, label, build = rng.choices(mix, weights=weights)[0]
+                actor = rng.choice(everyone if role == "any" else actors[role])
+                method, path, body = build(actor, rng, args)
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body, headers=actor["headers"] if role != "any" else None)
+                except httpx.HTTPError:
+                    response = None
+                sample = samples[label]
+                sample["latencies"].append((time.perf_counter() - start) * 1000)
+                sample["status"][response.status_code if response is not None else 599] += 1
+                if response is not None and "x-db-query-count" in response.headers:
+                    sample["queries"].append(int(response.headers["x-db-query-count"]))
+                    sample["db_ms"].append(float(response.headers["x-db-time-ms"]))
+
+        started = time.perf_counter()
+        await asyncio.gather(*[virtual_user(i) for i in range(args.concurrency)])
+        return summarize(samples, time.perf_counter() - started)
+
+def git_commit():
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=here, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here, capture_output=True, text=True).stdout.strip())
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def dataset_counts():
+    db = SessionLocal()
+    try:
+        return {model.__tablename__: db.scalar(select(func.count()).select_from(model)) for model in (School, Teacher, Student, Subject, Marks)}
+    finally:
+        db.close()
+
+def compare(report: dict, base_path: str):
+    """Print per-endpoint changes against an earlier report."""
+    with open(base_path) as f:
+        base = json.load(f)
+    print(f"\nvs {base_path} ({base['meta'].get('commit')})")
+    for name, scenario in report["scenarios"].items():
+        old = base["scenarios"].get(name)
+        if not old:
+            continue
+        print(f"  {name}: {old['throughput_rps']} -> {scenario['throughput_rps']} req/s")
+        for label, e in scenario["endpoints"].items():
+            o = old["endpoints"].get(label)
+            if not o:
+                continue
+            p50, p99 = e["latency_ms"]["p50"], e["latency_ms"]["p99"]
+            change = (p99 - o["latency_ms"]["p99"]) / o["latency_ms"]["p99"] * 100 if o["latency_ms"]["p99"] else 0
+            print(f"    {label:<38} p50 {o['latency_ms']['p50']:>8} -> {p50:<8} p99 {o['latency_ms']['p99']:>8} -> {p99:<8} ({change:+.0f}%)")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Load benchmark for the API")
+    parser.add_argument("scenarios", nargs="*", help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--schools", type=int, default=2)
+    parser.add_argument("--teachers", type=int, default=5, help="per school")
+    parser.add_argument("--students", type=int, default=30, help="per teacher")
+    parser.add_argument("--subjects", type=int, default=5, help="per school")
+    parser.add_argument("--fresh", action="store_true", help="delete and reseed the SQLite bench database")
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users per scenario")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    parser.add_argument("--batch", type=int, default=20, help="students per add-marks request")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--out", default="bench_report.json")
+    parser.add_argument("--compare", help="earlier report to print changes against")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    prepare(args)
+    actors = load_actors()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "database": engine.url.render_as_string(hide_password=True),
+            "target": args.url or "in-process",
+            "dataset": dataset_counts(),
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "bcrypt_rounds": BCRYPT_ROUNDS
+        },
+        "scenarios": {}
+    }
+    # One event loop for every scenario: the async engine's pooled connections belong to it
+    async def run_all():
+        for name in args.scenarios or list(SCENARIOS):
+            report["scenarios"][name] = await run_scenario(name, actors, args)
+
+    asyncio.run(run_all())
+    for name, result in report["scenarios"].items():
+        print(f"\n{name}: {result['requests']} requests, {result['throughput_rps']} req/s, {result['errors']} errors")
+        for label, e in result["endpoints"].items():
+            q = e["queries"]["mean"] if e["queries"] else "-"
+            db = e["db_time_ms"]["mean"] if e["db_time_ms"] else "-"
+            print(f"  {label:<38} n={e['requests']:<6} p50 {e['latency_ms']['p50']:>8}ms  p95 {e['latency_ms']['p95']:>8}ms  p99 {e['latency_ms']['p99']:>8}ms  queries {q}  db {db}ms")
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Report written to {args.out}")
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == "__main__":
+    main_cli()
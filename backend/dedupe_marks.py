@@ -0,0 +1,32 @@
+from sqlalchemy import text
+from database import engine
+from models.marks import Marks
+
+# One-off: collapse duplicate (student_id, subject_id) marks rows, keeping the
+# most recent one, then add the unique key that marks upserts rely on.
+def dedupe_marks():
+    with engine.begin() as conn:
+        duplicates = conn.execute(text(
+            "SELECT COUNT(*) - COUNT(DISTINCT student_id, subject_id) FROM marks"
+            if engine.dialect.name == "mysql" else
+            "SELECT COUNT(*) - (SELECT COUNT(*) FROM (SELECT 1 FROM marks GROUP BY student_id, subject_id)) FROM marks"
+        )).scalar()
+        print(f"Found {duplicates} duplicate marks rows")
+
+        # The derived table lets MySQL delete from the table it selects from
+        deleted = conn.execute(text("""
+            DELETE FROM marks WHERE id NOT IN (
+                SELECT id FROM (
+                    SELECT MAX(id) AS id FROM marks GROUP BY student_id, subject_id
+                ) AS keep_rows
+            )
+        """)).rowcount
+        print(f"✅ Deleted {deleted} rows")
+
+        for index in Marks.__table__.indexes:
+            if index.name == "uq_marks_student_subject":
+                index.create(conn, checkfirst=True)
+                print(f"✅ Unique key {index.name} in place")
+
+if __name__ == "__main__":
+    dedupe_marks()
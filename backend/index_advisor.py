@@ -0,0 +1,123 @@
+import sys
+from collections import defaultdict
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select
+from database import engine, async_engine, read_engine, async_read_engine, SessionLocal
+from models.user import User, RoleEnum
+from models.teacher import Teacher
+from models.student import Student
+from auth.jwt_handler import create_access_token
+import main
+
+# Index advisor: calls every GET route as one user of each role against the
+# configured database, records the SELECTs each route runs, and EXPLAINs them.
+# Flags full table scans (and full index scans) so missing indexes show up
+# before they hurt on a large marks table. Only calls GETs, but those are not
+# all read-only: the dashboard and insights routes store a fresh snapshot in
+# school_analytics (the cache write any caller would trigger). Run from backend/:
+#   python index_advisor.py            all GET routes
+#   python index_advisor.py /api/ml    only routes under a prefix
+
+def sample_tokens(db):
+    """A token for the first active user of each role, with the usual claims."""
+    tokens = {}
+    for role in RoleEnum:
+        user = db.scalars(select(User).where(User.role == role, User.is_active == True).limit(1)).first()
+        if user is None:
+            continue
+        claims = {"sub": str(user.id), "role": role.value, "school_id": user.school_id}
+        if role == RoleEnum.teacher:
+            claims["teacher_id"] = db.scalar(select(Teacher.id).where(Teacher.user_id == user.id))
+        elif role == RoleEnum.student:
+            claims["student_id"] = db.scalar(select(Student.id).where(Student.user_id == user.id))
+        tokens[role.value] = (create_access_token(claims), user.school_id)
+    return tokens
+
+def route_paths(db, prefix: str, school_id):
+    """GET paths to exercise, with {student_id} filled from the caller's school."""
+    student_id = db.scalar(select(Student.id).where(Student.school_id == school_id).limit(1)) if school_id else None
+    # The OpenAPI schema lists every mounted route with its full prefix
+    for path, operations in main.app.openapi()["paths"].items():
+        if "get" not in operations or not path.startswith(prefix):
+            continue
+        if "{student_id}" in path:
+            if student_id is None:
+                continue
+            yield path.replace("{student_id}", str(student_id))
+        elif "{" not in path:
+            yield path
+
+def explain(conn, statement: str, params):
+    """Return a list of findings for one statement; empty when it is index-driven."""
+    findings = []
+    if engine.dialect.name == "mysql":
+        for row in conn.exec_driver_sql("EXPLAIN " + statement, params).mappings():
+            extra = row.get("Extra") or ""
+            if row["type"] == "ALL":
+                findings.append(f"FULL SCAN {row['table']} (~{row['rows']} rows) {extra}".strip())
+            elif row["type"] == "index":
+                findings.append(f"full index scan {row['table']} via {row['key']} (~{row['rows']} rows)")
+            elif "Using temporary" in extra or "Using filesort" in extra:
+                findings.append(f"{row['table']}: {extra}")
+    else:
+        for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, params):
+            detail = row[-1]
+            if detail.startswith("SCAN ") and "USING" not in detail:
+                findings.append("FULL SCAN " + detail[5:])
+            elif detail.startswith("SCAN "):
+                findings.append("full index scan " + detail[5:])
+            elif "TEMP B-TREE" in detail:
+                findings.append(detail)
+    return findings
+
+def run(prefix: str = "/api"):
+    captured = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    # Read routes run on the replica engines when READ_DATABASE_URL is set;
+    # without one they are the primary engines and are listened to once
+    engines = []
+    for e in (engine, async_engine.sync_engine, read_engine, async_read_engine.sync_engine):
+        if not any(e is seen for seen in engines):
+            engines.append(e)
+    for e in engines:
+        event.listen(e, "before_cursor_execute", record)
+
+    db = SessionLocal()
+    try:
+        tokens = sample_tokens(db)
+        plans = {}
+        for role, (token, school_id) in tokens.items():
+            client = TestClient(main.app, raise_server_exceptions=False)
+            headers = {"Authorization": f"Bearer {token}"}
+            for path in route_paths(db, prefix, school_id):
+                captured.clear()
+                response = client.get(path, headers=headers)
+                if response.status_code < 300:
+                    plans[(path, role)] = list(captured)
+    finally:
+        db.close()
+        for e in engines:
+            event.remove(e, "before_cursor_execute", record)
+
+    flagged = 0
+    with engine.connect() as conn:
+        for (path, role), statements in sorted(plans.items()):
+            findings = defaultdict(list)
+            for statement, params in statements:
+                for finding in explain(conn, statement, params):
+                    findings[finding].append(" ".join(statement.split())[:120])
+            print(f"{'!!' if findings else 'ok'} GET {path} as {role} ({len(statements)} queries)")
+            for finding, queries in findings.items():
+                flagged += 1
+                print(f"     {finding}")
+                print(f"       e.g. {queries[0]}")
+
+    print(f"\n{len(plans)} route/role pairs checked, {flagged} scan finding(s)")
+    return flagged
+
+if __name__ == "__main__":
+    run(sys.argv[1] if len(sys.argv) > 1 else "/api")
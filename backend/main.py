@@ -1,15 +1,23 @@
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base
+from fastapi.responses import PlainTextResponse
+from database import engine, async_engine, read_engine, async_read_engine, pool_stats, Base
+from auth.jwt_handler import password_hasher
+from services import metrics, sql_profile
+from services.report_cards import pdf_cache
+from ml.predict import school_models
 
 # Import models for creating tables
-from models import user, student, marks, school, teacher, subject
+from models import user, student, marks, school, teacher, subject, school_stats, student_mark_stats, school_mark_rollup, school_analytics
 
 # Import routes
 from routes import auth, super_admin, school_admin, teacher, student, marks as marks_route, ml
 
-# Create the database tables
-Base.metadata.create_all(bind=engine)
+# Create missing tables on startup for local runs. Deployments manage the
+# schema with migrations (`alembic upgrade head`) and set AUTO_CREATE_TABLES=0.
+if os.getenv("AUTO_CREATE_TABLES", "1") == "1":
+    Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="Student Performance Analytics Platform")
 
@@ -24,7 +32,45 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination metadata for the list/report endpoints
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
+app.add_middleware(sql_profile.SqlProfileMiddleware)
+# Outermost, so its latencies include every other middleware
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Query counts, slow-query log and N+1 warnings; async engines' statements are
+# EXPLAINed through the sync engine for the same database
+sql_profile.instrument({
+    engine: engine,
+    async_engine.sync_engine: engine,
+    read_engine: read_engine,
+    async_read_engine.sync_engine: read_engine,
+})
+
+# Pool checkout timing, once per distinct pool (the read engines may share the primary's)
+for name, e in {"primary": engine, "primary_async": async_engine.sync_engine,
+                "read": read_engine, "read_async": async_read_engine.sync_engine}.items():
+    if name.startswith("read") and e in (engine, async_engine.sync_engine):
+        continue
+    metrics.instrument_pool(name, e)
+
+def _process_metrics():
+    pools = {name: p for name, p in pool_stats().items() if isinstance(p, dict)}
+    hasher = password_hasher.stats()
+    models = school_models.stats()
+    return [
+        ("db_pool_checked_out", "gauge", "Connections currently checked out", [({"engine": n}, p["checked_out"]) for n, p in pools.items()]),
+        ("db_pool_overflow", "gauge", "Connections open beyond pool_size", [({"engine": n}, p["overflow"]) for n, p in pools.items()]),
+        ("password_hash_pending", "gauge", "bcrypt jobs queued or running", [({}, hasher["pending"])]),
+        ("password_hash_completed_total", "counter", "bcrypt jobs finished", [({}, hasher["completed"])]),
+        ("password_hash_rejected_total", "counter", "bcrypt jobs rejected with 503", [({}, hasher["rejected"])]),
+        ("report_card_cache_bytes", "gauge", "Rendered PDFs held in this process", [({}, pdf_cache.size)]),
+        ("school_model_cache_bytes", "gauge", "Per-school grade model files held in this process", [({}, models["bytes"])]),
+        ("school_model_cache_schools", "gauge", "Schools tracked by the model cache", [({}, models["schools"])]),
+    ]
+
+metrics.register_collector(_process_metrics)
 
 # Register routes
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
@@ -38,3 +84,8 @@ app.include_router(ml.router, prefix="/api/ml", tags=["Machine Learning"])
 @app.get("/")
 def root():
     return {"message": "Welcome to the Student Performance Analytics API"}
+
+# Prometheus scrape target; keep it off the public internet at the proxy
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
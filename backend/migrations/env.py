@@ -0,0 +1,35 @@
+from logging.config import fileConfig
+from alembic import context
+from database import Base, engine, SQLALCHEMY_DATABASE_URL
+
+# Register every table on Base.metadata for --autogenerate
+from models import user, student, marks, school, teacher, subject, school_stats, student_mark_stats, school_mark_rollup, school_analytics
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+def run_migrations_offline():
+    # `alembic upgrade head --sql` prints the DDL instead of running it
+    context.configure(
+        url=SQLALCHEMY_DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=True
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    with engine.connect() as connection:
+        # Batch mode lets the same migrations alter tables on SQLite
+        context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True)
+        with context.begin_transaction():
+            context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
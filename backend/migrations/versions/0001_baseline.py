@@ -0,0 +1,103 @@
+"""Baseline: the schema as created by the original models/ and schema.sql
+
+Fresh databases get it from `alembic upgrade head`. Databases created earlier
+by create_all or schema.sql already match it once dedupe_marks.py has added
+the unique marks key; mark them with `alembic stamp 0001`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+ROLES = ("super_admin", "school_admin", "teacher", "student")
+
+def upgrade():
+    op.create_table(
+        "schools",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("address", sa.TEXT()),
+        sa.Column("email", sa.String(255)),
+        sa.Column("phone", sa.String(20)),
+        sa.Column("created_by", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_schools_id", "schools", ["id"])
+
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("email", sa.String(255), nullable=False),
+        sa.Column("password_hash", sa.String(255), nullable=False),
+        sa.Column("role", sa.Enum(*ROLES, name="roleenum"), nullable=False),
+        sa.Column("school_id", sa.Integer(), sa.ForeignKey("schools.id", ondelete="CASCADE"), nullable=True),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("is_default_password", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    # schools <-> users reference each other, so this key is added once both exist
+    with op.batch_alter_table("schools") as batch:
+        batch.create_foreign_key("fk_schools_created_by", "users", ["created_by"], ["id"], ondelete="SET NULL")
+
+    op.create_table(
+        "subjects",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("school_id", sa.Integer(), sa.ForeignKey("schools.id", ondelete="CASCADE"), nullable=False),
+    )
+    op.create_index("ix_subjects_id", "subjects", ["id"])
+
+    op.create_table(
+        "teachers",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False, unique=True),
+        sa.Column("school_id", sa.Integer(), sa.ForeignKey("schools.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("subject_specialization", sa.String(100)),
+    )
+    op.create_index("ix_teachers_id", "teachers", ["id"])
+
+    op.create_table(
+        "students",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False, unique=True),
+        sa.Column("teacher_id", sa.Integer(), sa.ForeignKey("teachers.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("school_id", sa.Integer(), sa.ForeignKey("schools.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("age", sa.Integer()),
+        sa.Column("gender", sa.String(50)),
+        sa.Column("class", sa.String(20)),
+    )
+    op.create_index("ix_students_id", "students", ["id"])
+
+    op.create_table(
+        "marks",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("student_id", sa.Integer(), sa.ForeignKey("students.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("subject_id", sa.Integer(), sa.ForeignKey("subjects.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("school_id", sa.Integer(), sa.ForeignKey("schools.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("mid_term", sa.DECIMAL(5, 2)),
+        sa.Column("final_term", sa.DECIMAL(5, 2)),
+        sa.Column("assignment", sa.DECIMAL(5, 2)),
+        sa.Column("total", sa.DECIMAL(5, 2)),
+        sa.Column("grade", sa.String(2)),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_marks_id", "marks", ["id"])
+    op.create_index("uq_marks_student_subject", "marks", ["student_id", "subject_id"], unique=True)
+
+def downgrade():
+    with op.batch_alter_table("schools") as batch:
+        batch.drop_constraint("fk_schools_created_by", type_="foreignkey")
+    for table in ["marks", "students", "teachers", "subjects", "users", "schools"]:
+        op.drop_table(table)
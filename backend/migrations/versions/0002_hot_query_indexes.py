@@ -0,0 +1,33 @@
+"""Composite indexes for the dashboard/report filters
+
+marks(school_id, student_id): every school-scoped marks query filters on
+school_id and joins or groups on student_id. students(school_id, teacher_id):
+roster, at-risk and cluster queries filter by school and then teacher.
+marks(student_id, subject_id) is already covered by uq_marks_student_subject.
+
+InnoDB builds these online (ALGORITHM=INPLACE, LOCK=NONE), so reads and writes
+continue while the marks index is built.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index("ix_marks_school_student", "marks", ["school_id", "student_id"])
+    op.create_index("ix_students_school_teacher", "students", ["school_id", "teacher_id"])
+
+def downgrade():
+    if op.get_bind().dialect.name == "mysql":
+        # MySQL dropped the implicit school_id foreign key indexes when these
+        # composites took over; put single-column ones back before dropping
+        op.create_index("ix_marks_school_id", "marks", ["school_id"])
+        op.create_index("ix_students_school_id", "students", ["school_id"])
+    op.drop_index("ix_students_school_teacher", table_name="students")
+    op.drop_index("ix_marks_school_student", table_name="marks")
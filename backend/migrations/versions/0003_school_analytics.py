@@ -0,0 +1,62 @@
+"""Per-school counters and pre-aggregated school analytics
+
+school_stats holds teacher/student/marks counts per school and a
+data_version counting its writes. student_mark_stats and school_mark_rollups
+hold running counts/sums of marks totals, updated by deltas on every marks
+write; school_analytics stores the dashboard payload built from them, valid
+while its data_version matches school_stats.
+
+The tables start empty: run reconcile_school_stats.py after upgrading to
+count existing rows and fill the rollups.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "school_stats",
+        sa.Column("school_id", sa.Integer(), sa.ForeignKey("schools.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("teacher_count", sa.Integer(), nullable=False),
+        sa.Column("student_count", sa.Integer(), nullable=False),
+        sa.Column("mark_count", sa.Integer(), nullable=False),
+        sa.Column("data_version", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+
+    op.create_table(
+        "student_mark_stats",
+        sa.Column("student_id", sa.Integer(), sa.ForeignKey("students.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("school_id", sa.Integer(), sa.ForeignKey("schools.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("mark_count", sa.Integer(), nullable=False),
+        sa.Column("total_sum", sa.DECIMAL(14, 2), nullable=False),
+    )
+    op.create_index("ix_student_mark_stats_school_id", "student_mark_stats", ["school_id"])
+
+    op.create_table(
+        "school_mark_rollups",
+        sa.Column("school_id", sa.Integer(), sa.ForeignKey("schools.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("dimension", sa.String(16), primary_key=True),
+        sa.Column("key", sa.String(32), primary_key=True),
+        sa.Column("mark_count", sa.Integer(), nullable=False),
+        sa.Column("total_sum", sa.DECIMAL(14, 2), nullable=False),
+    )
+
+    op.create_table(
+        "school_analytics",
+        sa.Column("school_id", sa.Integer(), sa.ForeignKey("schools.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("data_version", sa.BigInteger(), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("built_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+
+def downgrade():
+    for table in ["school_analytics", "school_mark_rollups", "student_mark_stats", "school_stats"]:
+        op.drop_table(table)
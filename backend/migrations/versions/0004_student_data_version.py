@@ -0,0 +1,24 @@
+"""Per-student data version for ETags
+
+student_mark_stats.data_version is bumped with every change to the
+student's marks; conditional GETs on the student's own views key on it.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table("student_mark_stats") as batch:
+        batch.add_column(sa.Column("data_version", sa.BigInteger(), nullable=False, server_default="0"))
+
+def downgrade():
+    with op.batch_alter_table("student_mark_stats") as batch:
+        batch.drop_column("data_version")
@@ -1,46 +1,141 @@
-import pandas as pd
-from sklearn.cluster import KMeans
+import os
+from collections import namedtuple
+import numpy as np
+from services import metrics
 
-def cluster_students(data: list):
+# "exact": optimal 1-D k-partition (NumPy only, deterministic)
+# "kmeans": sklearn KMeans, the original implementation
+CLUSTER_BACKEND = os.getenv("CLUSTER_BACKEND", "exact")
+
+# Tier names from lowest to highest and the `total` cut points between them.
+# A total above thresholds[i] belongs to labels[i + 1].
+TierModel = namedtuple("TierModel", ["labels", "thresholds"])
+
+TIER_LABELS = {
+    1: ["Medium"],
+    2: ["Low", "High"],
+    3: ["Low", "Medium", "High"],
+}
+
+def _segment_cost(s1, s2, i, j):
+    # Sum of squared deviations of sorted x[i:j] around its mean, from prefix sums
+    n = j - i
+    seg = s1[j] - s1[i]
+    return (s2[j] - s2[i]) - seg * seg / n
+
+def _optimal_centers(values: np.ndarray, k: int) -> np.ndarray:
+    """Centers of the optimal k-means partition of 1-D data.
+
+    Dynamic programme over sorted values: D[m][j] is the best cost of splitting
+    the first j values into m clusters. The optimal split point is monotone in
+    j, so each layer is solved by divide and conquer, evaluating one whole
+    recursion level at a time with NumPy. O(k * n log n).
+    """
+    x = np.sort(values)
+    n = len(x)
+    x = x - x.mean()  # centring keeps the prefix-sum costs well conditioned
+    s1 = np.concatenate(([0.0], np.cumsum(x)))
+    s2 = np.concatenate(([0.0], np.cumsum(x * x)))
+
+    j_all = np.arange(n + 1)
+    prev = np.full(n + 1, np.inf)
+    prev[1:] = _segment_cost(s1, s2, 0, j_all[1:])
+    splits = []
+
+    for m in range(2, k + 1):
+        cur = np.full(n + 1, np.inf)
+        arg = np.zeros(n + 1, dtype=np.int64)
+        jlo = np.array([m]); jhi = np.array([n])
+        olo = np.array([m - 1]); ohi = np.array([n - 1])
+
+        while len(jlo):
+            mid = (jlo + jhi) // 2
+            hi = np.minimum(ohi, mid - 1)
+            widths = hi - olo + 1
+
+            seg = np.repeat(np.arange(len(mid)), widths)
+            starts = np.concatenate(([0], np.cumsum(widths)[:-1]))
+            i = olo[seg] + (np.arange(len(seg)) - starts[seg])
+            j = mid[seg]
+            val = prev[i] + _segment_cost(s1, s2, i, j)
+
+            # First (smallest i) minimum per segment
+            best_val = np.minimum.reduceat(val, starts)
+            hit = np.flatnonzero(val == best_val[seg])
+            _, first = np.unique(seg[hit], return_index=True)
+            best_i = i[hit[first]]
+
+            cur[mid] = best_val
+            arg[mid] = best_i
+
+            left = jlo <= mid - 1
+            right = mid + 1 <= jhi
+            jlo, jhi, olo, ohi = (
+                np.concatenate((jlo[left], mid[right] + 1)),
+                np.concatenate((mid[left] - 1, jhi[right])),
+                np.concatenate((olo[left], best_i[right])),
+                np.concatenate((best_i[left], ohi[right])),
+            )
+
+        splits.append(arg)
+        prev = cur
+
+    # Walk the split points back from the full range
+    bounds = [n]
+    for arg in reversed(splits):
+        bounds.append(int(arg[bounds[-1]]))
+    bounds.append(0)
+    bounds.reverse()
+
+    x_sorted = np.sort(values)
+    return np.array([x_sorted[bounds[c]:bounds[c + 1]].mean() for c in range(k)])
+
+def _kmeans_centers(values: np.ndarray, k: int) -> np.ndarray:
+    from sklearn.cluster import KMeans
+
+    kmeans = KMeans(n_clusters=k, random_state=42, n_init='auto')
+    kmeans.fit(values.reshape(-1, 1))
+    return np.sort(kmeans.cluster_centers_.ravel())
+
+@metrics.timed("fit_tiers")
+def fit_tiers(totals, backend: str | None = None):
+    """Fit up to 3 tiers on `totals`; returns (label per total, TierModel)."""
+    values = np.asarray(totals, dtype=np.float64)
+    if len(values) == 0:
+        return [], TierModel([], [])
+
+    # Identical totals must share a tier, so cap k at the number of distinct values
+    k = min(3, len(np.unique(values)))
+    if k == 1:
+        model = TierModel(TIER_LABELS[1], [])
+        return [model.labels[0]] * len(values), model
+
+    backend = backend or CLUSTER_BACKEND
+    if backend == "kmeans":
+        centers = _kmeans_centers(values, k)
+    elif backend == "exact":
+        centers = _optimal_centers(values, k)
+    else:
+        raise ValueError(f"Unknown cluster backend: {backend}")
+
+    # Nearest-centre boundaries; for the optimal partition these reproduce it exactly
+    thresholds = ((centers[:-1] + centers[1:]) / 2).tolist()
+    model = TierModel(TIER_LABELS[k], thresholds)
+    idx = np.searchsorted(thresholds, values, side="left")
+    return [model.labels[i] for i in idx], model
+
+def classify_total(total: float, model: TierModel) -> str:
+    """Place a new total into previously fitted tiers without refitting."""
+    if not model.labels:
+        return "Unknown"
+    return model.labels[int(np.searchsorted(model.thresholds, total, side="left"))]
+
+def cluster_students(data: list, backend: str | None = None):
     if not data:
         return []
-        
-    df = pd.DataFrame(data)
-    
-    # We need at least 3 students to form 3 clusters
-    n_clusters = 3 if len(df) >= 3 else len(df)
-    
-    if n_clusters == 0:
-        return []
-        
-    if n_clusters == 1:
-        # If only 1 or 2 students, just return them as "Medium" or similar
-        return [{"id": row['id'], "name": row['name'], "total": row['total'], "performance_label": "Medium"} for _, row in df.iterrows()]
-        
-    # Features for clustering
-    X = df[['total']]
-    
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init='auto')
-    df['cluster'] = kmeans.fit_predict(X)
-    
-    # Map clusters to High/Medium/Low based on average total
-    cluster_centers = df.groupby('cluster')['total'].mean().sort_values()
-    
-    if n_clusters == 3:
-        label_map = {
-            cluster_centers.index[0]: 'Low',
-            cluster_centers.index[1]: 'Medium',
-            cluster_centers.index[2]: 'High'
-        }
-    else:
-        label_map = {
-            cluster_centers.index[0]: 'Low',
-            cluster_centers.index[1]: 'High'
-        }
-        
-    df['performance_label'] = df['cluster'].map(label_map)
-    
-    # Convert back to dict
-    result = df[['id', 'name', 'total', 'performance_label']].to_dict('records')
-    return result
 
+    labels, _ = fit_tiers([row['total'] for row in data], backend)
+    return [
+        {"id": row['id'], "name": row['name'], "total": row['total'], "performance_label": label}
+        for row, label in zip(data, labels)
+    ]
@@ -1,33 +1,284 @@
+import hashlib
 import os
 import pickle
+import threading
+import time
+import logging
+from collections import OrderedDict, namedtuple
+from datetime import datetime
 import pandas as pd
 import numpy as np
+from services import metrics
 
-def predict_grade(mid_term: float, assignment: float):
-    model_dir = os.path.dirname(os.path.abspath(__file__))
-    model_path = os.path.join(model_dir, "grade_model.pkl")
-    
-    if not os.path.exists(model_path):
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grade_model.pkl")
+# Optional per-school models (school_<id>.pkl), written by train_model.py --per-school
+SCHOOL_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "school_models")
+
+# How often (seconds) each worker stats the model file to pick up a retrained model
+MODEL_CHECK_INTERVAL = float(os.getenv("MODEL_CHECK_INTERVAL", "5"))
+# Per-school models held in memory per worker, by model file plus lookup grid
+# size; least recently used go first
+SCHOOL_MODEL_CACHE_BYTES = int(os.getenv("SCHOOL_MODEL_CACHE_BYTES", str(256 * 1024 * 1024)))
+# Schools tracked per worker, including those without a model of their own
+SCHOOL_MODEL_CACHE_ENTRIES = int(os.getenv("SCHOOL_MODEL_CACHE_ENTRIES", "10000"))
+# "grid" answers inputs on the 0.01 mark grid from the model's precomputed
+# lookup grid (when train_model.py exported one); "forest" always runs the trees
+PREDICTION_MODE = os.getenv("PREDICTION_MODE", "grid")
+
+# One cell per (mid_term, assignment) pair in hundredths: index into
+# model.classes_ and the confidence percentage in hundredths of a percent
+GRID_DTYPE = np.dtype([("grade", np.uint8), ("confidence", np.uint16)])
+
+LoadedModel = namedtuple("LoadedModel", ["model", "version", "grid"], defaults=(None,))
+# Memory-mapped GRID_DTYPE table; cell [i, j] is mid_term (mid_min + i) / 100,
+# assignment (assignment_min + j) / 100. `model` is the forest it was checked against.
+LookupGrid = namedtuple("LookupGrid", ["table", "mid_min", "assignment_min", "model"])
+
+def forest_fingerprint(model) -> str:
+    """Hash of everything a forest's answers depend on: classes, features and every tree's nodes."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((list(model.classes_), list(getattr(model, "feature_names_in_", [])))).encode())
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        for array in (tree.children_left, tree.children_right, tree.feature, tree.threshold, tree.value):
+            digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+def load_grid(model_path: str, bundle: dict):
+    """Memory-map the lookup grid a bundle refers to, or None.
+
+    A grid made from any other forest than the bundle's is rejected.
+    """
+    meta = bundle.get("grid")
+    if not meta:
+        return None
+    fingerprint = forest_fingerprint(bundle["model"])
+    if meta.get("fingerprint") != fingerprint or fingerprint[:16] not in meta["file"]:
+        logger.warning("Lookup grid %s was made from another model; using the forest", meta["file"])
+        return None
+    try:
+        table = np.load(os.path.join(os.path.dirname(model_path), meta["file"]), mmap_mode="r")
+    except (OSError, ValueError):
+        logger.exception("Failed to load lookup grid for %s; using the forest", model_path)
+        return None
+    if table.dtype != GRID_DTYPE or table.shape != tuple(meta["shape"]):
+        logger.warning("Lookup grid %s does not match its model; using the forest", meta["file"])
+        return None
+    return LookupGrid(table, meta["mid_min"], meta["assignment_min"], bundle["model"])
+
+class ModelRegistry:
+    """Holds the unpickled grade model in memory for the lifetime of the worker.
+
+    The file is re-stat'ed at most once per check interval; when its mtime/size
+    changes the new model is loaded and swapped in with a single reference
+    assignment, so concurrent requests always see a complete model.
+    """
+
+    def __init__(self, path: str, check_interval: float = MODEL_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._active = None
+        self._signature = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        # Size of the loaded file plus its mapped lookup grid, a stand-in for the model's memory
+        self.size = 0
+
+    def get(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._refresh(now)
+        return self._active
+
+    def reload(self):
+        with self._lock:
+            self._signature = None
+            self._next_check = 0.0
+        return self.get()
+
+    def _refresh(self, now: float):
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self._active = None
+                self._signature = None
+                self.size = 0
+                return
+
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature == self._signature:
+                return
+
+            try:
+                with open(self.path, "rb") as f:
+                    model = pickle.load(f)
+            except Exception:
+                # Keep serving the previous model if the new file is unreadable
+                logger.exception("Failed to load grade model from %s", self.path)
+                return
+
+            grid = None
+            if isinstance(model, dict):
+                # Bundle written by train_model.py: the estimator plus its training metadata
+                version = f"{model['trained_at']:%Y%m%d%H%M%S}-v{model['version']}"
+                if model.get("school_id") is not None:
+                    version += f"-school{model['school_id']}"
+                grid = load_grid(self.path, model)
+                model = model["model"]
+            else:
+                version = datetime.fromtimestamp(stat.st_mtime).strftime("%Y%m%d%H%M%S")
+            self._active = LoadedModel(model, version, grid)
+            self._signature = signature
+            self.size = stat.st_size + (grid.table.nbytes if grid is not None else 0)
+            logger.info("Loaded grade model version %s", version)
+
+registry = ModelRegistry(MODEL_PATH)
+
+class SchoolModelCache:
+    """Per-school models, each loaded on first use through its own ModelRegistry.
+
+    Holds at most max_bytes of model files and grids (and max_entries schools) per
+    worker, evicting the least recently used school first. Schools without a
+    model file cost one stat per check interval and fall back to the global
+    model.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_entries: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size = 0
+        self._registries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, school_id: int):
+        with self._lock:
+            entry = self._registries.get(school_id)
+            if entry is None:
+                # [registry, bytes counted in self.size for it]
+                entry = self._registries[school_id] = [ModelRegistry(os.path.join(self.directory, f"school_{school_id}.pkl")), 0]
+            else:
+                self._registries.move_to_end(school_id)
+        # Loading happens under the registry's own lock, so other schools are not held up
+        loaded = entry[0].get()
+        if entry[0].size != entry[1] or len(self._registries) > self.max_entries:
+            with self._lock:
+                if self._registries.get(school_id) is entry:
+                    self.size += entry[0].size - entry[1]
+                    entry[1] = entry[0].size
+                self._evict()
+        return loaded
+
+    def _evict(self):
+        while len(self._registries) > 1 and (self.size > self.max_bytes or len(self._registries) > self.max_entries):
+            _, (_, counted) = self._registries.popitem(last=False)
+            self.size -= counted
+
+    def stats(self):
+        with self._lock:
+            return {"schools": len(self._registries), "bytes": self.size, "max_bytes": self.max_bytes}
+
+school_models = SchoolModelCache(SCHOOL_MODEL_DIR, SCHOOL_MODEL_CACHE_BYTES, SCHOOL_MODEL_CACHE_ENTRIES)
+
+def resolve_model(school_id: int | None = None):
+    """The school's own model when it has one, else the global model (None if neither)."""
+    if school_id is not None:
+        loaded = school_models.get(school_id)
+        if loaded is not None:
+            return loaded
+    return registry.get()
+
+def _feature_frame(model, mid_terms, assignments):
+    X = np.column_stack((
+        np.asarray(mid_terms, dtype=np.float64),
+        np.asarray(assignments, dtype=np.float64)
+    ))
+    # Models fitted on a DataFrame expect the same column names back
+    if hasattr(model, "feature_names_in_"):
+        return pd.DataFrame(X, columns=model.feature_names_in_)
+    return X
+
+@metrics.timed("predict_grades")
+def predict_grades(mid_terms, assignments, school_id: int | None = None):
+    """Score N (mid_term, assignment) pairs with a single predict_proba call."""
+    if len(mid_terms) != len(assignments):
+        return {"error": "mid_term and assignment must have the same length."}
+
+    loaded = resolve_model(school_id)
+    if loaded is None:
         return {"error": "Model not trained yet."}
-        
-    with open(model_path, "rb") as f:
-        model = pickle.load(f)
-        
-    # Create input format matching training data
-    features = pd.DataFrame({
-        'mid_term': [mid_term],
-        'assignment': [assignment]
-    })
-    
-    # Predict grade
-    predicted_grade = model.predict(features)[0]
-    
-    # Get probability/confidence
-    probabilities = model.predict_proba(features)[0]
-    confidence_percentage = round(float(np.max(probabilities)) * 100, 2)
-    
+    model = loaded.model
+
+    if len(mid_terms) == 0:
+        return {"predictions": [], "model_version": loaded.version}
+
+    if loaded.grid is not None and PREDICTION_MODE == "grid":
+        grades, confidences = lookup_grid(model, loaded.grid, mid_terms, assignments)
+    else:
+        grades, confidences = forest_predict(model, mid_terms, assignments)
+
     return {
-        "predicted_grade": str(predicted_grade),
-        "confidence_percentage": confidence_percentage
+        "predictions": [
+            {"predicted_grade": str(g), "confidence_percentage": c}
+            for g, c in zip(grades, confidences)
+        ],
+        "model_version": loaded.version
     }
 
+def forest_predict(model, mid_terms, assignments):
+    """(grades, confidence percentages) straight from the trees."""
+    # RandomForest.predict is argmax over predict_proba, so one pass gives both
+    probabilities = model.predict_proba(_feature_frame(model, mid_terms, assignments))
+    best = probabilities.argmax(axis=1)
+    confidences = probabilities[np.arange(len(best)), best]
+    return model.classes_[best], [round(float(c) * 100, 2) for c in confidences]
+
+def lookup_grid(model, grid: LookupGrid, mid_terms, assignments):
+    """forest_predict() answered from the lookup grid with one fancy-index read.
+
+    Only inputs that are exactly a grid value (the float nearest to some k/100,
+    which is what the grid was evaluated on) inside the grid are looked up, so
+    the answers are identical to the forest's; the rest go to the forest.
+    """
+    if grid.model is not model:
+        return forest_predict(model, mid_terms, assignments)
+    mids = np.asarray(mid_terms, dtype=np.float64)
+    assigns = np.asarray(assignments, dtype=np.float64)
+    mid_keys = np.rint(mids * 100)
+    assign_keys = np.rint(assigns * 100)
+    with np.errstate(invalid="ignore"):
+        i = mid_keys - grid.mid_min
+        j = assign_keys - grid.assignment_min
+        rows, cols = grid.table.shape
+        hit = (mid_keys / 100 == mids) & (assign_keys / 100 == assigns) \
+            & (i >= 0) & (i < rows) & (j >= 0) & (j < cols)
+
+    cells = grid.table[i[hit].astype(np.intp), j[hit].astype(np.intp)]
+    grades = np.empty(len(mids), dtype=object)
+    confidences = np.empty(len(mids), dtype=object)
+    grades[hit] = model.classes_[cells["grade"]]
+    # n / 100 is the same float as round(p * 100, 2) was when the grid was built
+    confidences[hit] = (cells["confidence"] / 100).tolist()
+
+    miss = ~hit
+    if miss.any():
+        grades[miss], confidences[miss] = forest_predict(model, mids[miss], assigns[miss])
+    return grades, confidences.tolist()
+
+def predict_grade(mid_term: float, assignment: float, school_id: int | None = None):
+    result = predict_grades([mid_term], [assignment], school_id)
+    if "error" in result:
+        return result
+
+    return {
+        **result["predictions"][0],
+        "model_version": result["model_version"]
+    }
@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+import threading
+
+# Retrain the grade model in the background once this many marks were written
+# through this worker since its last trigger (0 = only by hand)
+RETRAIN_AFTER_MARKS = int(os.getenv("RETRAIN_AFTER_MARKS", "0"))
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_changed = 0
+_process = None
+_lock = threading.Lock()
+
+def note_marks_changed(count: int):
+    """Call after committing marks; starts an incremental training run when due.
+
+    Training runs in its own process (python -m ml.train_model --incremental),
+    so it never competes with request handling for this worker's memory or
+    GIL. Workers pick the new model up through the registry's file check, and
+    the training lock keeps runs triggered by several workers from overlapping.
+    """
+    global _changed, _process
+    if RETRAIN_AFTER_MARKS <= 0 or count <= 0:
+        return
+    with _lock:
+        _changed += count
+        if _changed < RETRAIN_AFTER_MARKS:
+            return
+        if _process is not None and _process.poll() is None:
+            # Still training; the marks counted so far go into the next run
+            return
+        _changed = 0
+        _process = subprocess.Popen(
+            [sys.executable, "-m", "ml.train_model", "--incremental"],
+            cwd=BACKEND_DIR,
+            stdout=subprocess.DEVNULL
+        )
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import threading
+import time
+from collections import namedtuple
+from ml.cluster import fit_tiers
+
+# Upper bound (seconds) on how long a tier assignment is served without refitting.
+# Writes in this worker invalidate immediately; the TTL bounds staleness for
+# writes that landed on other workers.
+TIER_CACHE_TTL = float(os.getenv("TIER_CACHE_TTL", "300"))
+
+# `model` holds the fitted thresholds so new totals can be placed without refitting
+# `data_version` is the school_stats.data_version the caller saw before loading, if any
+TierAssignment = namedtuple("TierAssignment", ["generation", "expires_at", "clusters", "labels", "model", "data_version"])
+
+_entries = {}        # scope -> TierAssignment
+_generations = {}    # school_id -> int, bumped on every marks/roster write
+_scope_locks = {}    # scope -> Lock, so a cold scope is fitted once, not once per request
+_async_scope_locks = {}  # scope -> asyncio.Lock, same for async routes
+_lock = threading.Lock()
+
+def school_scope(school_id: int):
+    return (school_id, None)
+
+def teacher_scope(school_id: int, teacher_id: int):
+    return (school_id, teacher_id)
+
+def lookup(scope, data_version=None):
+    """Return (entry or None, generation) for a scope; pass the generation back to store().
+
+    With a data_version, entries fitted before the database reached it are
+    misses too, which catches writes made on other workers straight away.
+    """
+    with _lock:
+        entry = _entries.get(scope)
+        generation = _generations.get(scope[0], 0)
+    if entry is not None and entry.generation == generation and entry.expires_at > time.monotonic() \
+            and (data_version is None or (entry.data_version or 0) >= data_version):
+        return entry, generation
+    return None, generation
+
+def store(scope, generation: int, data: list, data_version=None):
+    """Cluster `data` and cache it unless the school changed while it was being loaded."""
+    labels, model = fit_tiers([row["total"] for row in data])
+    clusters = [
+        {"id": row["id"], "name": row["name"], "total": row["total"], "performance_label": label}
+        for row, label in zip(data, labels)
+    ]
+    entry = TierAssignment(
+        generation,
+        time.monotonic() + TIER_CACHE_TTL,
+        clusters,
+        {c["id"]: c["performance_label"] for c in clusters},
+        model,
+        data_version
+    )
+    with _lock:
+        if _generations.get(scope[0], 0) == generation:
+            _entries[scope] = entry
+    return entry
+
+def get_tiers(scope, loader):
+    """Cached tiers for a scope, calling loader() for the clustering input on a miss."""
+    entry, _ = lookup(scope)
+    if entry is not None:
+        return entry
+
+    with _lock:
+        scope_lock = _scope_locks.setdefault(scope, threading.Lock())
+    with scope_lock:
+        entry, generation = lookup(scope)
+        if entry is not None:
+            return entry
+        return store(scope, generation, loader())
+
+async def aget_tiers(scope, loader, data_version=None):
+    """Async variant of get_tiers; loader is a coroutine function."""
+    entry, _ = lookup(scope, data_version)
+    if entry is not None:
+        return entry
+
+    scope_lock = _async_scope_locks.setdefault(scope, asyncio.Lock())
+    async with scope_lock:
+        entry, generation = lookup(scope, data_version)
+        if entry is not None:
+            return entry
+        data = await loader()
+        # Fitting is CPU-bound, keep it off the event loop
+        return await asyncio.to_thread(store, scope, generation, data, data_version)
+
+def invalidate_school(school_id: int):
+    with _lock:
+        _generations[school_id] = _generations.get(school_id, 0) + 1
+        for scope in [s for s in _entries if s[0] == school_id]:
+            del _entries[scope]
@@ -1,56 +1,456 @@
+import argparse
 import os
-import pandas as pd
 import pickle
-from sklearn.model_selection import train_test_split
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score
+from sqlalchemy import select, func, cast, Integer
 
 from database import engine
+from models.marks import Marks
+from ml.predict import MODEL_PATH, SCHOOL_MODEL_DIR, GRID_DTYPE, forest_fingerprint, forest_predict
+
+# Training state next to the model: the aggregated counts (per school) the
+# forests were fitted on and the last mark id they include, so the next run
+# only reads newer marks
+COUNTS_FORMAT = 2
+COUNTS_PATH = MODEL_PATH[:-len(".pkl")] + ".counts.npz"
+LOCK_PATH = MODEL_PATH + ".lock"
+
+# Marks read per round trip (keyset on id, so memory stays flat)
+TRAIN_CHUNK_SIZE = int(os.getenv("TRAIN_CHUNK_SIZE", "100000"))
+N_ESTIMATORS = 100
+# Trees added per incremental run, and the size at which the forest is rebuilt instead
+INCREMENTAL_TREES = int(os.getenv("TRAIN_INCREMENTAL_TREES", "10"))
+MAX_TREES = int(os.getenv("TRAIN_MAX_TREES", "200"))
+# More new marks than this fraction of the trained ones means a full rebuild
+INCREMENTAL_MAX_FRACTION = float(os.getenv("TRAIN_INCREMENTAL_MAX_FRACTION", "0.25"))
+# A lock older than this is left over from a crashed run
+LOCK_STALE_SECONDS = int(os.getenv("TRAIN_LOCK_STALE_SECONDS", "3600"))
+TEST_FRACTION = 0.2
+# Per-school models (--per-school or TRAIN_PER_SCHOOL=1): schools with fewer
+# marks than this keep using the global model
+TRAIN_PER_SCHOOL = os.getenv("TRAIN_PER_SCHOOL", "0") == "1"
+SCHOOL_MODEL_MIN_MARKS = int(os.getenv("SCHOOL_MODEL_MIN_MARKS", "500"))
+SCHOOL_MODEL_TREES = int(os.getenv("SCHOOL_MODEL_TREES", "50"))
+# Lookup grid next to each model (see predict.py): every 0.01 step of the
+# trained mid_term x assignment range, 3 bytes per cell; skipped above GRID_MAX_CELLS
+PREDICTION_GRID = os.getenv("PREDICTION_GRID", "1") == "1"
+GRID_MAX_CELLS = int(os.getenv("GRID_MAX_CELLS", "25000000"))
+# Grid cells re-predicted by the forest one batch at a time before the grid is saved
+GRID_PARITY_SAMPLE = int(os.getenv("GRID_PARITY_SAMPLE", "20000"))
+_GRID_BATCH = 200000
+
+GRADES = ["A+", "A", "B", "C", "D", "F"]
+GRADE_CODES = {g: i for i, g in enumerate(GRADES)}
+
+# Marks are DECIMAL(5,2): in hundredths every value fits in (-100000, 100000),
+# so (school_id, mid_term, assignment, grade) packs into one int64 key, with
+# room for school ids up to ~28 million
+_OFFSET = 100000
+_SPAN = 2 * _OFFSET
+_SCORE_KEYS = _SPAN * _SPAN * 8
+
+def _pack(school_ids, mid_terms, assignments, codes):
+    return school_ids * _SCORE_KEYS + ((mid_terms + _OFFSET) * _SPAN + (assignments + _OFFSET)) * 8 + codes
+
+def _unpack(keys):
+    """(mid_term, assignment) in hundredths and grade codes; the school is ignored."""
+    rest = keys % _SCORE_KEYS
+    codes = rest % 8
+    rest = rest // 8
+    return rest // _SPAN - _OFFSET, rest % _SPAN - _OFFSET, codes
+
+def merge_counts(keys_a, weights_a, keys_b, weights_b):
+    keys, inverse = np.unique(np.concatenate((keys_a, keys_b)), return_inverse=True)
+    weights = np.bincount(inverse, weights=np.concatenate((weights_a, weights_b)), minlength=len(keys))
+    return keys, weights.astype(np.int64)
+
+def global_counts(keys, weights):
+    """Per-school counts summed across schools."""
+    return merge_counts(keys % _SCORE_KEYS, weights, np.empty(0, np.int64), np.empty(0, np.int64))
+
+def school_counts(keys, weights):
+    """Yield (school_id, keys, weights) for each school in a sorted count table."""
+    schools = keys // _SCORE_KEYS
+    bounds = [0, *(np.flatnonzero(np.diff(schools)) + 1), len(keys)]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if end > start:
+            yield int(schools[start]), keys[start:end], weights[start:end]
+
+def read_counts(after_id: int = 0):
+    """Distinct (school_id, mid_term, assignment, grade) rows of marks with id > after_id, with counts.
 
-def train_student_model():
-    print("Loading marks data from MySQL database...")
-    # SQL query to load data directly from DB
-    query = "SELECT mid_term, assignment, grade FROM marks WHERE mid_term IS NOT NULL AND assignment IS NOT NULL AND grade IS NOT NULL"
-    df = pd.read_sql(query, con=engine)
-    
-    if len(df) < 10:
-        print(f"Warning: Only {len(df)} records found. Model may not be accurate. Add more records.")
-        # Proceed anyway for demo
-        
-    print(f"Loaded {len(df)} records.")
-    
-    # Features & Target
-    X = df[['mid_term', 'assignment']]
-    y = df['grade']
-    
-    # Needs at least 2 samples to split
-    if len(df) > 1:
-        # Split Data (80/20)
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    Marks are read TRAIN_CHUNK_SIZE at a time as integers (hundredths) and
+    folded into the running counts, so memory depends on the number of
+    distinct score combinations, not on the size of the marks table.
+    Returns (keys, weights, rows read, last mark id).
+    """
+    query = select(
+        Marks.id,
+        Marks.school_id,
+        cast(func.round(Marks.mid_term * 100), Integer),
+        cast(func.round(Marks.assignment * 100), Integer),
+        Marks.grade
+    ).where(Marks.mid_term.isnot(None), Marks.assignment.isnot(None), Marks.grade.isnot(None))
+
+    keys, weights = np.empty(0, np.int64), np.empty(0, np.int64)
+    rows, last_id = 0, after_id
+    with engine.connect() as conn:
+        while True:
+            chunk = conn.execute(query.where(Marks.id > last_id).order_by(Marks.id).limit(TRAIN_CHUNK_SIZE)).all()
+            if not chunk:
+                break
+            ids, school_ids, mid_terms, assignments, grades = zip(*chunk)
+            last_id = ids[-1]
+            codes = np.fromiter((GRADE_CODES.get(g, -1) for g in grades), np.int64, len(grades))
+            known = codes >= 0
+            chunk_keys = _pack(
+                np.asarray(school_ids, np.int64)[known],
+                np.asarray(mid_terms, np.int64)[known],
+                np.asarray(assignments, np.int64)[known],
+                codes[known]
+            )
+            unique, counts = np.unique(chunk_keys, return_counts=True)
+            keys, weights = merge_counts(keys, weights, unique, counts)
+            rows += int(known.sum())
+    return keys, weights, rows, last_id
+
+def _frame(keys):
+    mid_terms, assignments, codes = _unpack(keys)
+    # Same feature names as before, so predict.py's DataFrame input still matches
+    X = pd.DataFrame({"mid_term": mid_terms / 100, "assignment": assignments / 100})
+    return X, np.array(GRADES, dtype=object)[codes]
+
+def split(weights, seed: int = 42):
+    """Hold out ~20% of the marks: each combination's test count is a binomial
+    draw, the same as a random 80/20 split of the underlying rows."""
+    if weights.sum() <= 1:
+        return weights, weights
+    test = np.random.default_rng(seed).binomial(weights, TEST_FRACTION)
+    train = weights - test
+    return (train, test) if train.any() and test.any() else (weights, weights)
+
+def fit(train_keys, train_weights, test_keys, test_weights, model=None, seed: int = 42, n_estimators: int = N_ESTIMATORS):
+    """Fit on a count table (one weighted row per combination) and score the test table.
+
+    With `model`, INCREMENTAL_TREES trees are added to it (warm start) instead
+    of growing a new forest. Returns (model, accuracy on the test marks).
+    """
+    X, y = _frame(train_keys)
+    rows = train_weights > 0
+    if model is None:
+        model = RandomForestClassifier(n_estimators=n_estimators, random_state=seed)
     else:
-        # Extremely small dataset fallback
-        X_train, X_test, y_train, y_test = X, X, y, y
-        
-    print("Training RandomForestClassifier...")
-    # Initialize and Train Model
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
-    
-    # Predict & Evaluate
-    y_pred = model.predict(X_test)
-    accuracy = accuracy_score(y_test, y_pred)
-    print(f"Model Accuracy Score: {accuracy * 100:.2f}%")
-    
-    # Save Model
-    model_dir = os.path.dirname(os.path.abspath(__file__))
-    model_path = os.path.join(model_dir, "grade_model.pkl")
-    
-    with open(model_path, "wb") as f:
-        pickle.dump(model, f)
-        
-    print(f"Model saved successfully to {model_path}")
-    return accuracy
+        model.set_params(warm_start=True, n_estimators=len(model.estimators_) + INCREMENTAL_TREES)
+    model.fit(X[rows], y[rows], sample_weight=train_weights[rows])
+    model.set_params(warm_start=False)
 
-if __name__ == "__main__":
-    train_student_model()
+    X, y = _frame(test_keys)
+    rows = test_weights > 0
+    correct = model.predict(X[rows]) == y[rows]
+    return model, float((test_weights[rows] * correct).sum() / test_weights[rows].sum())
+
+def _split_intervals(model, feature: str, values):
+    """Which gap between the forest's split thresholds on `feature` each value falls in.
+
+    Values in the same gap go the same way at every node of every tree, so
+    the forest gives them identical answers.
+    """
+    index = list(model.feature_names_in_).index(feature)
+    thresholds = np.unique(np.concatenate([
+        tree.tree_.threshold[tree.tree_.feature == index] for tree in model.estimators_
+    ]))
+    # Trees test float32(x) <= threshold
+    return np.searchsorted(thresholds, values.astype(np.float32).astype(np.float64), side="left")
+
+def _grid_cells(model, mid_terms, assignments):
+    grades, confidences = forest_predict(model, mid_terms, assignments)
+    codes = np.searchsorted(model.classes_, grades)
+    # Hundredths of a percent; n / 100 gives back exactly round(p * 100, 2)
+    return codes.astype(np.uint8), np.rint(np.array(confidences) * 100).astype(np.uint16)
+
+def export_grid(model, keys, model_path: str, version: int):
+    """Evaluate the model over every (mid_term, assignment) 0.01 step in the range of
+    `keys` and save the answers as a GRID_DTYPE array next to `model_path` (loadable with mmap).
+
+    The forest runs once per gap between its split thresholds rather than once
+    per cell, and a sample of cells is checked against the forest before
+    anything is written. Returns the grid metadata for the bundle, or None
+    when there is no grid for this model.
+    """
+    mid_terms, assignments, _ = _unpack(keys)
+    mid_min, assignment_min = int(mid_terms.min()), int(assignments.min())
+    shape = (int(mid_terms.max()) - mid_min + 1, int(assignments.max()) - assignment_min + 1)
+    if shape[0] * shape[1] > GRID_MAX_CELLS:
+        print(f"Lookup grid skipped: {shape[0]} x {shape[1]} cells is over GRID_MAX_CELLS ({GRID_MAX_CELLS}).")
+        return None
+    mid_values = np.arange(mid_min, mid_min + shape[0]) / 100
+    assignment_values = np.arange(assignment_min, assignment_min + shape[1]) / 100
+
+    # One representative grid value per gap on each axis
+    _, mid_reps, mid_gap = np.unique(_split_intervals(model, "mid_term", mid_values), return_index=True, return_inverse=True)
+    _, assignment_reps, assignment_gap = np.unique(_split_intervals(model, "assignment", assignment_values), return_index=True, return_inverse=True)
+    rep_mids = np.repeat(mid_values[mid_reps], len(assignment_reps))
+    rep_assignments = np.tile(assignment_values[assignment_reps], len(mid_reps))
+    codes = np.empty(len(rep_mids), np.uint8)
+    confidences = np.empty(len(rep_mids), np.uint16)
+    for start in range(0, len(rep_mids), _GRID_BATCH):
+        end = start + _GRID_BATCH
+        codes[start:end], confidences[start:end] = _grid_cells(model, rep_mids[start:end], rep_assignments[start:end])
 
+    gaps = np.ix_(mid_gap, assignment_gap)
+    table = np.empty(shape, GRID_DTYPE)
+    table["grade"] = codes.reshape(len(mid_reps), len(assignment_reps))[gaps]
+    table["confidence"] = confidences.reshape(len(mid_reps), len(assignment_reps))[gaps]
+
+    # Parity: random cells plus the corners, straight from the forest
+    rng = np.random.default_rng(0)
+    i = np.concatenate(([0, 0, shape[0] - 1, shape[0] - 1], rng.integers(0, shape[0], GRID_PARITY_SAMPLE)))
+    j = np.concatenate(([0, shape[1] - 1, 0, shape[1] - 1], rng.integers(0, shape[1], GRID_PARITY_SAMPLE)))
+    expected_codes, expected_confidences = _grid_cells(model, mid_values[i], assignment_values[j])
+    cells = table[i, j]
+    mismatched = int(((cells["grade"] != expected_codes) | (cells["confidence"] != expected_confidences)).sum())
+    if mismatched:
+        # Serve this model from the forest rather than from a grid that is wrong somewhere
+        print(f"Lookup grid NOT saved: it disagrees with the forest on {mismatched} of {len(i)} sampled cells.")
+        return None
+
+    fingerprint = forest_fingerprint(model)
+    path = _grid_path(model_path, version, fingerprint)
+    _write_atomic(path, lambda f: np.save(f, table))
+    print(f"Lookup grid: {shape[0]} x {shape[1]} cells ({table.nbytes / 1e6:.1f} MB) from "
+          f"{len(rep_mids)} forest evaluations, {len(i)} sampled cells match the forest")
+    return {"file": os.path.basename(path), "shape": shape, "mid_min": mid_min, "assignment_min": assignment_min,
+            "fingerprint": fingerprint}
+
+def _grid_path(model_path: str, version: int, fingerprint: str) -> str:
+    # Named after the forest, so a file is never replaced by a grid of another
+    # model and workers still on the previous model keep their own grid
+    return f"{model_path[:-len('.pkl')]}.v{version}.{fingerprint[:16]}.grid.npy"
+
+def _remove_grids(model_path: str, keep=None):
+    directory = os.path.dirname(model_path)
+    prefix = os.path.basename(model_path)[:-len(".pkl")] + ".v"
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith(".grid.npy") and name != keep:
+            os.unlink(os.path.join(directory, name))
+
+def load_state():
+    """The current model bundle and its counts, or None when there is nothing to build on."""
+    try:
+        with open(MODEL_PATH, "rb") as f:
+            bundle = pickle.load(f)
+        with np.load(COUNTS_PATH) as state:
+            version, keys, weights = int(state["version"]), state["keys"], state["weights"]
+            counts_format = int(state["format"]) if "format" in state else 1
+    except (OSError, EOFError, KeyError, ValueError, pickle.UnpicklingError):
+        return None
+    # Older files hold a bare estimator without training state
+    if not isinstance(bundle, dict) or version != bundle.get("version") or counts_format != COUNTS_FORMAT:
+        return None
+    return bundle, keys, weights
+
+def _write_atomic(path: str, write):
+    # Temp file in the same directory, then rename: readers see the old or the new file, never a partial one
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        # mkstemp creates 0600; API workers may run as another user
+        os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def latest_version() -> int:
+    """Highest version in the current bundle or counts file (0 when there is none).
+
+    Full runs continue from here too, so every saved model gets a new version.
+    """
+    versions = [0]
+    try:
+        with open(MODEL_PATH, "rb") as f:
+            bundle = pickle.load(f)
+        if isinstance(bundle, dict):
+            versions.append(int(bundle["version"]))
+    except (OSError, EOFError, KeyError, ValueError, pickle.UnpicklingError):
+        pass
+    try:
+        with np.load(COUNTS_PATH) as state:
+            versions.append(int(state["version"]))
+    except (OSError, KeyError, ValueError):
+        pass
+    return max(versions)
+
+def save(model, keys, weights, rows: int, last_id: int, accuracy: float, version: int, previous=None, incremental: bool = False) -> dict:
+    grid = export_grid(model, keys, MODEL_PATH, version) if PREDICTION_GRID else None
+    bundle = {
+        "model": model,
+        "version": version,
+        "trained_at": datetime.now(),
+        "rows": rows,
+        "max_mark_id": last_id,
+        "accuracy": accuracy,
+        "incremental_runs": (previous["incremental_runs"] + 1) if incremental else 0,
+        "grid": grid
+    }
+    # Counts first: a run that dies in between leaves a version mismatch, which means a full rebuild next time
+    _write_atomic(COUNTS_PATH, lambda f: np.savez(f, keys=keys, weights=weights, version=bundle["version"], format=COUNTS_FORMAT))
+    _write_atomic(MODEL_PATH, lambda f: pickle.dump(bundle, f, protocol=pickle.HIGHEST_PROTOCOL))
+    _remove_grids(MODEL_PATH, keep=grid and grid["file"])
+    return bundle
+
+@contextmanager
+def training_lock():
+    """Yields False when another process is already training."""
+    try:
+        fd = os.open(LOCK_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            stale = time.time() - os.path.getmtime(LOCK_PATH) > LOCK_STALE_SECONDS
+        except FileNotFoundError:
+            stale = True
+        if not stale:
+            yield False
+            return
+        os.unlink(LOCK_PATH)
+        fd = os.open(LOCK_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield True
+    finally:
+        os.unlink(LOCK_PATH)
+
+def _full_rebuild_reason(bundle, new_keys, new_rows: int):
+    if new_rows > INCREMENTAL_MAX_FRACTION * bundle["rows"]:
+        return f"{new_rows} new marks is over {INCREMENTAL_MAX_FRACTION:.0%} of the {bundle['rows']} trained"
+    if len(bundle["model"].estimators_) + INCREMENTAL_TREES > MAX_TREES:
+        return f"forest would exceed {MAX_TREES} trees"
+    new_grades = {GRADES[c] for c in np.unique(_unpack(new_keys)[2])} - set(bundle["model"].classes_)
+    if new_grades:
+        return f"new grade(s) {sorted(new_grades)}"
+    return None
+
+def school_model_path(school_id: int) -> str:
+    return os.path.join(SCHOOL_MODEL_DIR, f"school_{school_id}.pkl")
+
+def train_school_models(keys, weights, version: int, schools=None):
+    """Fit a model per school with at least SCHOOL_MODEL_MIN_MARKS marks.
+
+    `schools` limits the run to those ids (the ones with new marks); None
+    means every school, and then files of schools that no longer qualify are
+    removed so they fall back to the global model.
+    """
+    os.makedirs(SCHOOL_MODEL_DIR, exist_ok=True)
+    trained, kept, grids = 0, set(), {}
+    for school_id, school_keys, school_weights in school_counts(keys, weights):
+        if schools is not None and school_id not in schools:
+            kept.add(school_id)
+            continue
+        rows = int(school_weights.sum())
+        if rows < SCHOOL_MODEL_MIN_MARKS:
+            continue
+        school_keys, school_weights = global_counts(school_keys, school_weights)
+        train, test = split(school_weights)
+        model, accuracy = fit(school_keys, train, school_keys, test, n_estimators=SCHOOL_MODEL_TREES)
+        path = school_model_path(school_id)
+        grid = export_grid(model, school_keys, path, version) if PREDICTION_GRID else None
+        bundle = {"model": model, "version": version, "trained_at": datetime.now(), "school_id": school_id, "rows": rows, "accuracy": accuracy, "grid": grid}
+        _write_atomic(path, lambda f: pickle.dump(bundle, f, protocol=pickle.HIGHEST_PROTOCOL))
+        grids[school_id] = grid and grid["file"]
+        kept.add(school_id)
+        trained += 1
+
+    removed = 0
+    for name in os.listdir(SCHOOL_MODEL_DIR):
+        if not name.startswith("school_"):
+            continue
+        if name.endswith(".pkl"):
+            if schools is None and int(name[7:-4]) not in kept:
+                os.unlink(os.path.join(SCHOOL_MODEL_DIR, name))
+                removed += 1
+        elif name.endswith(".grid.npy"):
+            # Grids of the previous versions of retrained schools, and of removed schools
+            school_id = int(name[7:name.index(".v")])
+            if (school_id in grids and name != grids[school_id]) or (schools is None and school_id not in kept):
+                os.unlink(os.path.join(SCHOOL_MODEL_DIR, name))
+    print(f"Per-school models: {trained} trained, {removed} removed (schools under {SCHOOL_MODEL_MIN_MARKS} marks use the global model)")
+
+def train_student_model(incremental: bool = False, per_school: bool = TRAIN_PER_SCHOOL):
+    """Train the grade model and swap it in atomically.
+
+    incremental=True reads only marks added since the last run and warm-starts
+    extra trees on the merged counts; it falls back to a full rebuild when
+    there is no usable state, too much new data or the forest is at MAX_TREES.
+    Updated and deleted marks are only picked up by full rebuilds.
+    per_school=True also refits the models of schools with enough marks
+    (only those with new marks on incremental runs).
+    """
+    with training_lock() as locked:
+        if not locked:
+            print("Another training run is in progress; skipping.")
+            return None
+
+        state = load_state() if incremental else None
+        if incremental and state is None:
+            print("No incremental state from a previous run; doing a full rebuild.")
+        model = previous = touched = None
+        if state is not None:
+            previous, old_keys, old_weights = state
+            new_keys, new_weights, new_rows, last_id = read_counts(previous["max_mark_id"])
+            if new_rows == 0:
+                print(f"No new marks since version {previous['version']}; model unchanged.")
+                return previous["accuracy"]
+            reason = _full_rebuild_reason(previous, new_keys, new_rows)
+            if reason:
+                print(f"Full rebuild: {reason}.")
+            else:
+                print(f"Loaded {new_rows} new marks since version {previous['version']}.")
+                # Scored on held-out new marks only: the existing trees have seen every older one
+                test_keys, new_global = global_counts(new_keys, new_weights)
+                new_train, test = split(new_global)
+                train_keys, train = merge_counts(*global_counts(old_keys, old_weights), test_keys, new_train)
+                keys, weights = merge_counts(old_keys, old_weights, new_keys, new_weights)
+                rows, model = previous["rows"] + new_rows, previous["model"]
+                touched = {school_id for school_id, _, _ in school_counts(new_keys, new_weights)}
+
+        if model is None:
+            print(f"Loading marks in chunks of {TRAIN_CHUNK_SIZE}...")
+            keys, weights, rows, last_id = read_counts()
+            train_keys, global_weights = global_counts(keys, weights)
+            print(f"Loaded {rows} records ({len(train_keys)} distinct score/grade combinations).")
+            if rows == 0:
+                print("No marks to train on.")
+                return None
+            if rows < 10:
+                print(f"Warning: Only {rows} records found. Model may not be accurate. Add more records.")
+            train, test = split(global_weights)
+            test_keys = train_keys
+
+        warm = model is not None
+        print("Adding trees to the current forest..." if warm else "Training RandomForestClassifier...")
+        model, accuracy = fit(train_keys, train, test_keys, test, model)
+        print(f"Model Accuracy Score: {accuracy * 100:.2f}%")
+
+        version = max(latest_version(), previous["version"] if previous else 0) + 1
+        if per_school:
+            train_school_models(keys, weights, version, touched)
+        bundle = save(model, keys, weights, rows, last_id, accuracy, version, previous, incremental=warm)
+        print(f"Model version {bundle['version']} ({len(model.estimators_)} trees) saved to {MODEL_PATH}")
+        return accuracy
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the grade prediction model")
+    parser.add_argument("--incremental", action="store_true", help="only read marks added since the last run")
+    parser.add_argument("--per-school", action="store_true", default=TRAIN_PER_SCHOOL, help="also train models for schools with enough marks")
+    args = parser.parse_args()
+    train_student_model(incremental=args.incremental, per_school=args.per_school)
@@ -1,8 +1,14 @@
-from sqlalchemy import Column, Integer, String, DECIMAL, ForeignKey, DateTime, func
+from sqlalchemy import Column, Integer, String, DECIMAL, ForeignKey, DateTime, Index, func
 from database import Base
 
 class Marks(Base):
     __tablename__ = "marks"
+    __table_args__ = (
+        # One row per student per subject; marks writes upsert on this key
+        Index("uq_marks_student_subject", "student_id", "subject_id", unique=True),
+        # School-scoped dashboards filter on school_id, then join/group on student_id
+        Index("ix_marks_school_student", "school_id", "student_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
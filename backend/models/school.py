@@ -9,5 +9,5 @@ class School(Base):
     address = Column(TEXT)
     email = Column(String(255))
     phone = Column(String(20))
-    created_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    created_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL", use_alter=True, name="fk_schools_created_by"), nullable=True)
     created_at = Column(DateTime, server_default=func.now())
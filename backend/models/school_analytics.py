@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, BigInteger, JSON, DateTime, ForeignKey, func
+from database import Base
+
+class SchoolAnalytics(Base):
+    """Materialised dashboard/insights payload, valid while data_version matches school_stats."""
+    __tablename__ = "school_analytics"
+
+    school_id = Column(Integer, ForeignKey("schools.id", ondelete="CASCADE"), primary_key=True)
+    data_version = Column(BigInteger, nullable=False)
+    payload = Column(JSON, nullable=False)
+    built_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, DECIMAL, ForeignKey
+from database import Base
+
+class SchoolMarkRollup(Base):
+    """Running count and sum of marks totals per school by grade, subject or month."""
+    __tablename__ = "school_mark_rollups"
+
+    school_id = Column(Integer, ForeignKey("schools.id", ondelete="CASCADE"), primary_key=True)
+    dimension = Column(String(16), primary_key=True)  # "grade", "subject" or "month"
+    key = Column(String(32), primary_key=True)
+    mark_count = Column(Integer, nullable=False, default=0)
+    total_sum = Column(DECIMAL(14, 2), nullable=False, default=0)
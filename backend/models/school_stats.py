@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, BigInteger, ForeignKey
+from database import Base
+
+class SchoolStats(Base):
+    """Per-school row counts, kept in step with every roster/marks write."""
+    __tablename__ = "school_stats"
+
+    school_id = Column(Integer, ForeignKey("schools.id", ondelete="CASCADE"), primary_key=True)
+    teacher_count = Column(Integer, nullable=False, default=0)
+    student_count = Column(Integer, nullable=False, default=0)
+    mark_count = Column(Integer, nullable=False, default=0)
+    # Bumped on every write to the school's roster or marks
+    data_version = Column(BigInteger, nullable=False, default=0, server_default="0")
@@ -1,8 +1,12 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from database import Base
 
 class Student(Base):
     __tablename__ = "students"
+    __table_args__ = (
+        # Roster, at-risk and cluster queries filter by school, then teacher
+        Index("ix_students_school_teacher", "school_id", "teacher_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), unique=True, nullable=False)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, BigInteger, DECIMAL, ForeignKey
+from database import Base
+
+class StudentMarkStats(Base):
+    """Running count and sum of each student's marks totals (analytics rollup)."""
+    __tablename__ = "student_mark_stats"
+
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
+    school_id = Column(Integer, ForeignKey("schools.id", ondelete="CASCADE"), nullable=False, index=True)
+    mark_count = Column(Integer, nullable=False, default=0)
+    total_sum = Column(DECIMAL(14, 2), nullable=False, default=0)
+    # Bumped whenever any of the student's marks change (ETag for their own views)
+    data_version = Column(BigInteger, nullable=False, default=0, server_default="0")
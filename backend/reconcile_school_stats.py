@@ -0,0 +1,31 @@
+import sys
+from sqlalchemy import select
+from database import SessionLocal
+from models.school import School
+from services import school_stats, analytics
+
+# Recounts teachers/students/marks per school and repairs school_stats rows
+# that drifted, then rebuilds each school's analytics rollups from its marks.
+# Safe to run while the API is up (e.g. nightly from cron); also run once
+# after `alembic upgrade head` creates the tables, to backfill existing schools.
+# Usage: python reconcile_school_stats.py [school_id]
+def reconcile_school_stats(school_id: int | None = None):
+    db = SessionLocal()
+    try:
+        drift = school_stats.reconcile(db, school_id)
+        db.commit()
+        school_ids = [school_id] if school_id is not None else db.scalars(select(School.id)).all()
+        for sid in school_ids:
+            # One transaction per school keeps row locks short
+            analytics.rebuild(db, sid)
+            db.commit()
+    finally:
+        db.close()
+
+    for d in drift:
+        print(f"School {d['school_id']}: {d['before']} -> {d['after']}")
+    print(f"✅ Reconciled school_stats, {len(drift)} school(s) corrected")
+    print(f"✅ Rebuilt analytics rollups for {len(school_ids)} school(s)")
+
+if __name__ == "__main__":
+    reconcile_school_stats(int(sys.argv[1]) if len(sys.argv) > 1 else None)
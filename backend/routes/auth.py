@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from pydantic import BaseModel, EmailStr
-from database import get_db
+from database import get_async_db
 from models.user import User, RoleEnum
 from models.teacher import Teacher
 from models.student import Student
-from auth.jwt_handler import get_password_hash, verify_password, create_access_token, get_current_user
+from auth.jwt_handler import password_hasher, create_access_token, get_current_user, Principal
+from auth import principal_cache
 
 router = APIRouter()
 
@@ -35,10 +37,10 @@ class UserResponse(BaseModel):
         from_attributes = True
 
 @router.post("/login", response_model=Token)
-def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
-    # Authenticate user
-    user = db.query(User).filter(User.email == user_credentials.email).first()
-    if not user or not verify_password(user_credentials.password, user.password_hash):
+async def login(user_credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    # Authenticate user (bcrypt runs in the hashing pool, not on this worker)
+    user = await db.scalar(select(User).where(User.email == user_credentials.email))
+    if not user or not await password_hasher.verify(user_credentials.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -48,49 +50,50 @@ def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     if not user.is_active:
         raise HTTPException(status_code=400, detail="User account is deactivated")
 
-    # Get teacher_id if applicable
-    teacher_id = None
+    # Get teacher_id / student_id if applicable
+    teacher_id = student_id = None
     if user.role == RoleEnum.teacher:
-        teacher = db.query(Teacher).filter(Teacher.user_id == user.id).first()
-        if teacher:
-            teacher_id = teacher.id
+        teacher_id = await db.scalar(select(Teacher.id).where(Teacher.user_id == user.id))
     elif user.role == RoleEnum.student:
-        student = db.query(Student).filter(Student.user_id == user.id).first()
+        student = (await db.execute(select(Student.id, Student.teacher_id).where(Student.user_id == user.id))).first()
         if student:
-            teacher_id = student.teacher_id
+            student_id, teacher_id = student.id, student.teacher_id
 
-    # Create token containing user ID, role, school_id, and teacher_id
+    # Create token containing user ID, role, school_id, teacher_id and student_id
     access_token = create_access_token(
         data={
             "sub": str(user.id),
             "role": user.role.value,
             "school_id": user.school_id,
-            "teacher_id": teacher_id
+            "teacher_id": teacher_id,
+            "student_id": student_id
         }
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_profile(current_user: User = Depends(get_current_user)):
-    # For students, default password is their name
-    # We check if the password hash matches their name
-    is_default = verify_password(current_user.name, current_user.password_hash)
-    
+async def get_current_user_profile(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    # The cached principal only carries auth fields, so read the profile row
+    user = await db.get(User, current_user.id)
+    # is_default_password (password still equals the user's name) is maintained on every password write
     return UserResponse(
-        id=current_user.id,
-        name=current_user.name,
-        email=current_user.email,
-        role=current_user.role,
-        school_id=current_user.school_id,
-        is_active=current_user.is_active,
-        is_default_password=is_default
+        id=user.id,
+        name=user.name,
+        email=user.email,
+        role=user.role,
+        school_id=user.school_id,
+        is_active=user.is_active,
+        is_default_password=bool(user.is_default_password)
     )
 
 @router.post("/change-password")
-def change_password(data: PasswordChange, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    if not verify_password(data.old_password, current_user.password_hash):
+async def change_password(data: PasswordChange, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(User, current_user.id)
+    if not await password_hasher.verify(data.old_password, user.password_hash):
         raise HTTPException(status_code=400, detail="Incorrect old password")
     
-    current_user.password_hash = get_password_hash(data.new_password)
-    db.commit()
+    user.password_hash = await password_hasher.hash(data.new_password)
+    user.is_default_password = data.new_password == user.name
+    await db.commit()
+    principal_cache.invalidate_user(user.id)
     return {"message": "Password updated successfully"}
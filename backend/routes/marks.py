@@ -1,20 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, false
 from pydantic import BaseModel
 from typing import List, Optional
 
-from database import get_db
-from models.user import User, RoleEnum
+from database import get_db, get_async_read_db, get_read_db
+from models.user import RoleEnum
 from models.student import Student
 from models.marks import Marks
 from models.subject import Subject
-from auth.jwt_handler import get_current_user
+from auth.jwt_handler import get_current_user, Principal
+from ml import tier_cache, retrain
+from services.marks import upsert_marks
+from services import analytics
+from services.pagination import PageParams, page_params, apaginate
+from services.export import export_response
+from services.columnar import check_format, columnar_response
 
 router = APIRouter()
 
 # Dependency for Role Checking
-def require_admin_or_teacher(current_user: User = Depends(get_current_user)):
+async def require_admin_or_teacher(current_user: Principal = Depends(get_current_user)):
     if current_user.role not in [RoleEnum.super_admin, RoleEnum.school_admin, RoleEnum.teacher]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -55,7 +62,7 @@ def calculate_grade(total: float) -> str:
 
 # 1. POST /marks/add
 @router.post("/add", status_code=status.HTTP_201_CREATED)
-def add_marks(mark_data: MarkAddRequest, db: Session = Depends(get_db), current_user: User = Depends(require_admin_or_teacher)):
+def add_marks(mark_data: MarkAddRequest, db: Session = Depends(get_db), current_user: Principal = Depends(require_admin_or_teacher)):
     # Verify student exists in same school
     student = db.query(Student).filter(Student.id == mark_data.student_id, Student.school_id == current_user.school_id).first()
     if not student:
@@ -66,86 +73,114 @@ def add_marks(mark_data: MarkAddRequest, db: Session = Depends(get_db), current_
     if not subject:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Subject not found in your school")
 
-    total = round(mark_data.mid_term + mark_data.final_term + mark_data.assignment, 2)
-    grade = calculate_grade(total)
-    
-    new_mark = Marks(
-        student_id=mark_data.student_id,
-        subject_id=mark_data.subject_id,
-        school_id=current_user.school_id, # Link to school
-        mid_term=mark_data.mid_term,
-        final_term=mark_data.final_term,
-        assignment=mark_data.assignment,
-        total=total,
-        grade=grade
-    )
-    db.add(new_mark)
+    # Upsert: a second entry for the same student and subject replaces the first
+    upsert_marks(db, current_user.school_id, [mark_data.model_dump()])
     db.commit()
-    db.refresh(new_mark)
-    return new_mark
+    tier_cache.invalidate_school(current_user.school_id)
+    retrain.note_marks_changed(1)
 
-# 2. GET /marks/report
-@router.get("/report", response_model=List[MarkReportResponse])
-def get_marks_report(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    query = db.query(
+    return db.query(Marks).filter(
+        Marks.student_id == mark_data.student_id,
+        Marks.subject_id == mark_data.subject_id
+    ).first()
+
+def _report_query(current_user: Principal, class_name, subject_id, teacher_id, grade):
+    """Marks rows the caller may see, with the optional filters applied."""
+    query = select(
         Student.name.label("student_name"),
         Student.class_name,
         Subject.name.label("subject"),
         Marks.mid_term,
         Marks.final_term,
         Marks.assignment,
-        Marks.total,
+        func.coalesce(Marks.total, Marks.mid_term + Marks.final_term + Marks.assignment).label("total"),
         Marks.grade
     ).join(Marks, Student.id == Marks.student_id)\
      .join(Subject, Marks.subject_id == Subject.id)
 
     # Super Admin sees everything, others see only their school
     if current_user.role != RoleEnum.super_admin:
-        query = query.filter(Marks.school_id == current_user.school_id)
+        query = query.where(Marks.school_id == current_user.school_id)
 
     # Teachers see only their own students
     if current_user.role == RoleEnum.teacher:
-        from models.teacher import Teacher
-        teacher = db.query(Teacher).filter(Teacher.user_id == current_user.id).first()
-        if teacher:
-            query = query.filter(Student.teacher_id == teacher.id)
+        if current_user.teacher_id:
+            query = query.where(Student.teacher_id == current_user.teacher_id)
 
     # Students see only their own marks (already handled by school_id + student_id check if we wanted, but let's be explicit)
     if current_user.role == RoleEnum.student:
-        student = db.query(Student).filter(Student.user_id == current_user.id).first()
-        if not student:
-            return []
-        query = query.filter(Marks.student_id == student.id)
-        
-    results = query.all()
-    
-    response = []
-    for r in results:
-        tot = float(r.total) if r.total is not None else float(r.mid_term + r.final_term + r.assignment)
-        response.append({
-            "student_name": r.student_name,
-            "class_name": r.class_name,
-            "subject": r.subject,
-            "mid_term": float(r.mid_term),
-            "final_term": float(r.final_term),
-            "assignment": float(r.assignment),
-            "total": tot,
-            "grade": r.grade
-        })
-    return response
+        query = query.where(Marks.student_id == current_user.student_id) if current_user.student_id else query.where(false())
+
+    if class_name is not None:
+        query = query.where(Student.class_name == class_name)
+    if subject_id is not None:
+        query = query.where(Marks.subject_id == subject_id)
+    if teacher_id is not None:
+        query = query.where(Student.teacher_id == teacher_id)
+    if grade is not None:
+        query = query.where(Marks.grade == grade)
+    return query
+
+REPORT_COLUMNS = ["student_name", "class_name", "subject", "mid_term", "final_term", "assignment", "total", "grade"]
+REPORT_NUMERIC = ("mid_term", "final_term", "assignment", "total")
+
+def _report_row(r) -> dict:
+    return {
+        "student_name": r.student_name,
+        "class_name": r.class_name,
+        "subject": r.subject,
+        "mid_term": float(r.mid_term),
+        "final_term": float(r.final_term),
+        "assignment": float(r.assignment),
+        "total": float(r.total),
+        "grade": r.grade
+    }
+
+# 2. GET /marks/report
+@router.get("/report", response_model=List[MarkReportResponse])
+async def get_marks_report(
+    response: Response,
+    class_name: Optional[str] = None,
+    subject_id: Optional[int] = None,
+    teacher_id: Optional[int] = None,
+    grade: Optional[str] = None,
+    format: str = "json",
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    check_format(format)
+    query = _report_query(current_user, class_name, subject_id, teacher_id, grade)
+    results = await apaginate(db, response, query, Marks.id, page)
+    if format != "json":
+        return columnar_response(REPORT_COLUMNS, results, format, REPORT_NUMERIC, response.headers)
+    return [_report_row(r) for r in results]
+
+# 2b. GET /marks/report/export
+@router.get("/report/export")
+async def export_marks_report(
+    format: str = "csv",
+    class_name: Optional[str] = None,
+    subject_id: Optional[int] = None,
+    teacher_id: Optional[int] = None,
+    grade: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user)
+):
+    query = _report_query(current_user, class_name, subject_id, teacher_id, grade)
+    return export_response(query.order_by(Marks.id), _report_row, REPORT_COLUMNS, format, "marks_report")
 
 # 5. GET /marks/subject-average
 @router.get("/subject-average")
-def get_subject_average(db: Session = Depends(get_db), current_user: User = Depends(require_admin_or_teacher)):
-    query = db.query(
+async def get_subject_average(db: AsyncSession = Depends(get_async_read_db), current_user: Principal = Depends(require_admin_or_teacher)):
+    query = select(
         Subject.name.label("subject"),
         func.avg(Marks.mid_term + Marks.final_term + Marks.assignment).label("avg_total")
     ).join(Marks, Subject.id == Marks.subject_id)
     
     if current_user.role != RoleEnum.super_admin:
-        query = query.filter(Marks.school_id == current_user.school_id)
+        query = query.where(Marks.school_id == current_user.school_id)
         
-    results = query.group_by(Subject.id).all()
+    results = (await db.execute(query.group_by(Subject.id))).all()
     
     response = []
     for r in results:
@@ -157,7 +192,7 @@ def get_subject_average(db: Session = Depends(get_db), current_user: User = Depe
 
 # 3. GET /marks/student/{student_id}
 @router.get("/student/{student_id}")
-def get_student_marks(student_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_student_marks(student_id: int, db: Session = Depends(get_read_db), current_user: Principal = Depends(get_current_user)):
     student = db.query(Student).filter(Student.id == student_id).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
@@ -168,9 +203,7 @@ def get_student_marks(student_id: int, db: Session = Depends(get_db), current_us
             raise HTTPException(status_code=403, detail="Not authorized to view marks of another school")
             
         if current_user.role == RoleEnum.teacher:
-            from models.teacher import Teacher
-            t = db.query(Teacher).filter(Teacher.user_id == current_user.id).first()
-            if not t or student.teacher_id != t.id:
+            if not current_user.teacher_id or student.teacher_id != current_user.teacher_id:
                 raise HTTPException(status_code=403, detail="Not authorized to view this student")
         
         if current_user.role == RoleEnum.student:
@@ -196,7 +229,7 @@ def get_student_marks(student_id: int, db: Session = Depends(get_db), current_us
 
 # 4. PUT /marks/{mark_id}
 @router.put("/{mark_id}")
-def update_marks(mark_id: int, update_data: MarkUpdateRequest, db: Session = Depends(get_db), current_user: User = Depends(require_admin_or_teacher)):
+def update_marks(mark_id: int, update_data: MarkUpdateRequest, db: Session = Depends(get_db), current_user: Principal = Depends(require_admin_or_teacher)):
     mark = db.query(Marks).filter(Marks.id == mark_id).first()
     if not mark:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Mark not found")
@@ -205,6 +238,9 @@ def update_marks(mark_id: int, update_data: MarkUpdateRequest, db: Session = Dep
     if current_user.role != RoleEnum.super_admin:
         if mark.school_id != current_user.school_id:
             raise HTTPException(status_code=403, detail="Not authorized to update marks of another school")
+
+    old_total = mark.total if mark.total is not None else float(mark.mid_term) + float(mark.final_term) + float(mark.assignment)
+    old = analytics.mark_facts(mark.student_id, mark.subject_id, old_total, mark.grade, mark.created_at)
             
     if update_data.mid_term is not None: mark.mid_term = update_data.mid_term
     if update_data.final_term is not None: mark.final_term = update_data.final_term
@@ -213,10 +249,14 @@ def update_marks(mark_id: int, update_data: MarkUpdateRequest, db: Session = Dep
     mt = float(mark.mid_term)
     ft = float(mark.final_term)
     assgn = float(mark.assignment)
-    total = mt + ft + assgn
+    total = round(mt + ft + assgn, 2)
+    mark.total = total
     mark.grade = calculate_grade(total)
+    analytics.apply_changes(db, mark.school_id, [(old, old._replace(total=total, grade=mark.grade))])
     
     db.commit()
+    tier_cache.invalidate_school(mark.school_id)
+    retrain.note_marks_changed(1)
     db.refresh(mark)
     
     return mark
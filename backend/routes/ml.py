@@ -1,17 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from pydantic import BaseModel
 from typing import List, Optional
-from database import get_db
+from database import get_async_db, get_async_read_db
 from models.user import User, RoleEnum
 from models.student import Student
 from models.marks import Marks
 from models.teacher import Teacher
-from models.subject import Subject
-from auth.jwt_handler import get_current_user, check_role
-from ml.predict import predict_grade
-from ml.cluster import cluster_students
+from auth.jwt_handler import get_current_user, check_role, Principal
+from ml.predict import predict_grade, predict_grades
+from ml import tier_cache
+from services import analytics
+from services import etags
 
 router = APIRouter()
 
@@ -23,6 +24,22 @@ class PredictRequest(BaseModel):
 class PredictResponse(BaseModel):
     predicted_grade: str
     confidence_percentage: float
+    model_version: str | None = None
+
+class BatchPredictRequest(BaseModel):
+    mid_term: List[float]
+    assignment: List[float]
+
+class BatchPredictItem(BaseModel):
+    predicted_grade: str
+    confidence_percentage: float
+
+class BatchPredictResponse(BaseModel):
+    predictions: List[BatchPredictItem]
+    model_version: str | None = None
+
+# Upper bound on rows scored per batch request
+MAX_BATCH_PREDICTIONS = 10000
 
 class AtRiskStudent(BaseModel):
     student_name: str
@@ -32,19 +49,33 @@ class AtRiskStudent(BaseModel):
 
 # 1. POST /ml/predict-grade
 @router.post("/predict-grade", response_model=PredictResponse)
-def predict_student_grade_route(data: PredictRequest, current_user: User = Depends(get_current_user)):
+def predict_student_grade_route(data: PredictRequest, current_user: Principal = Depends(get_current_user)):
     check_role(current_user, [RoleEnum.teacher, RoleEnum.student])
-    result = predict_grade(data.mid_term, data.assignment)
+    result = predict_grade(data.mid_term, data.assignment, current_user.school_id)
+    if "error" in result:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=result["error"])
+    return result
+
+# 1b. POST /ml/predict-grade/batch
+@router.post("/predict-grade/batch", response_model=BatchPredictResponse)
+def predict_student_grades_batch_route(data: BatchPredictRequest, current_user: Principal = Depends(get_current_user)):
+    check_role(current_user, [RoleEnum.teacher, RoleEnum.student])
+    if len(data.mid_term) != len(data.assignment):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="mid_term and assignment must have the same length")
+    if len(data.mid_term) > MAX_BATCH_PREDICTIONS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {MAX_BATCH_PREDICTIONS} predictions per request")
+
+    result = predict_grades(data.mid_term, data.assignment, current_user.school_id)
     if "error" in result:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=result["error"])
     return result
 
 # 2. GET /ml/at-risk
 @router.get("/at-risk", response_model=List[AtRiskStudent])
-def get_at_risk_students(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_at_risk_students(db: AsyncSession = Depends(get_async_read_db), current_user: Principal = Depends(get_current_user)):
     check_role(current_user, [RoleEnum.school_admin, RoleEnum.teacher])
     
-    query = db.query(
+    query = select(
         Student.name.label("student_name"),
         Student.class_name,
         func.sum(Marks.total).label("total_marks"),
@@ -54,14 +85,13 @@ def get_at_risk_students(db: Session = Depends(get_db), current_user: User = Dep
      .join(User, Teacher.user_id == User.id)
 
     # Multi-tenant Isolation
-    query = query.filter(Student.school_id == current_user.school_id)
+    query = query.where(Student.school_id == current_user.school_id)
 
     if current_user.role == RoleEnum.teacher:
-        teacher = db.query(Teacher).filter(Teacher.user_id == current_user.id).first()
-        if teacher:
-            query = query.filter(Student.teacher_id == teacher.id)
+        if current_user.teacher_id:
+            query = query.where(Student.teacher_id == current_user.teacher_id)
 
-    student_totals = query.group_by(Student.id).all()
+    student_totals = (await db.execute(query.group_by(Student.id))).all()
     
     at_risk = []
     for st in student_totals:
@@ -77,75 +107,44 @@ def get_at_risk_students(db: Session = Depends(get_db), current_user: User = Dep
     return at_risk
 
 # 3. GET /ml/clusters
-@router.get("/clusters")
-def get_student_clusters(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+@router.get("/clusters", dependencies=[Depends(etags.conditional("clusters"))])
+async def get_student_clusters(request: Request, db: AsyncSession = Depends(get_async_read_db), current_user: Principal = Depends(get_current_user)):
     check_role(current_user, [RoleEnum.school_admin, RoleEnum.teacher])
     
-    query = db.query(
-        Student.id,
-        Student.name,
-        func.avg(Marks.total).label("avg_marks")
-    ).join(Marks, Student.id == Marks.student_id)\
-     .filter(Student.school_id == current_user.school_id)
-
+    scope = tier_cache.school_scope(current_user.school_id)
+    teacher_id = None
     if current_user.role == RoleEnum.teacher:
-        teacher = db.query(Teacher).filter(Teacher.user_id == current_user.id).first()
-        if teacher:
-            query = query.filter(Student.teacher_id == teacher.id)
+        teacher_id = current_user.teacher_id
+        if teacher_id:
+            scope = tier_cache.teacher_scope(current_user.school_id, teacher_id)
 
-    results = query.group_by(Student.id).all()
-    
-    if not results:
-        return []
+    async def load_totals():
+        query = select(
+            Student.id,
+            Student.name,
+            func.avg(Marks.total).label("avg_marks")
+        ).join(Marks, Student.id == Marks.student_id)\
+         .where(Student.school_id == current_user.school_id)
+
+        if teacher_id:
+            query = query.where(Student.teacher_id == teacher_id)
 
-    # Map to High/Medium/Low by avg marks using KMeans in cluster_students
-    data = [{"id": r.id, "name": r.name, "total": float(r.avg_marks or 0)} for r in results]
-    clusters = cluster_students(data)
-    return clusters
+        results = (await db.execute(query.group_by(Student.id))).all()
+        return [{"id": r.id, "name": r.name, "total": float(r.avg_marks or 0)} for r in results]
+
+    # Map to High/Medium/Low by avg marks (ml/cluster.py backend, cached per scope)
+    # Refit if the cached tiers predate the data version the ETag was built from
+    return (await tier_cache.aget_tiers(scope, load_totals, request.state.data_version)).clusters
 
 # 4. GET /ml/school-insights
 @router.get("/school-insights")
-def get_school_insights(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_school_insights(db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
     check_role(current_user, [RoleEnum.school_admin])
     
-    school_id = current_user.school_id
-    
-    # Lowest Average Subject
-    lowest_sub = db.query(
-        Subject.name,
-        func.avg(Marks.total).label("avg_score")
-    ).join(Marks, Subject.id == Marks.subject_id)\
-     .filter(Subject.school_id == school_id)\
-     .group_by(Subject.id).order_by("avg_score").first()
-
-    # Teacher whose students perform best
-    best_teacher = db.query(
-        User.name,
-        func.avg(Marks.total).label("avg_score")
-    ).join(Teacher, User.id == Teacher.user_id)\
-     .join(Student, Teacher.id == Student.teacher_id)\
-     .join(Marks, Student.id == Marks.student_id)\
-     .filter(Teacher.school_id == school_id)\
-     .group_by(Teacher.id).order_by(func.avg(Marks.total).desc()).first()
-
-    # Month-wise performance trend
-    trend = db.query(
-        extract('month', Marks.created_at).label("month"),
-        func.avg(Marks.total).label("avg_score")
-    ).filter(Marks.school_id == school_id)\
-     .group_by("month").all()
-    
-    # Grade distribution pie chart data
-    grade_dist = db.query(
-        Marks.grade,
-        func.count(Marks.id).label("count")
-    ).filter(Marks.school_id == school_id)\
-     .group_by(Marks.grade).all()
-
+    snapshot = await analytics.get_snapshot(db, current_user.school_id)
     return {
-        "lowest_subject": lowest_sub.name if lowest_sub else "N/A",
-        "best_teacher": best_teacher.name if best_teacher else "N/A",
-        "performance_trend": [{"month": int(t.month), "score": float(t.avg_score or 0)} for t in trend if t.month is not None],
-        "grade_distribution": [{"grade": g.grade, "count": g.count} for g in grade_dist]
+        "lowest_subject": snapshot["lowest_subject"],
+        "best_teacher": snapshot["best_teacher"],
+        "performance_trend": snapshot["performance_trend"],
+        "grade_distribution": snapshot["grade_distribution"]
     }
-
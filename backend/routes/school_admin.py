@@ -1,14 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from pydantic import BaseModel, EmailStr
-from database import get_db
+from typing import Optional
+from database import get_db, get_async_db, get_async_read_db
 from models.user import User, RoleEnum
 from models.teacher import Teacher
 from models.student import Student
 from models.marks import Marks
 from models.subject import Subject
-from auth.jwt_handler import get_current_user, check_role, get_password_hash
+from auth.jwt_handler import get_current_user, check_role, password_hasher, Principal
+from ml import tier_cache
+from auth import principal_cache
+from services import school_stats, analytics
+from services.pagination import PageParams, page_params, apaginate, as_dict
+from services.export import export_response
+from services import report_cards
+from services import etags
+from services.columnar import check_format, columnar_response
 
 router = APIRouter()
 
@@ -24,7 +34,7 @@ class TeacherDeleteRequest(BaseModel):
     reassign_to_id: int | None = None
 
 @router.post("/add-teacher", status_code=status.HTTP_201_CREATED)
-def add_teacher(teacher: TeacherCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def add_teacher(teacher: TeacherCreate, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     check_role(current_user, [RoleEnum.school_admin])
     
     db_user = db.query(User).filter(User.email == teacher.email).first()
@@ -34,9 +44,10 @@ def add_teacher(teacher: TeacherCreate, current_user: User = Depends(get_current
     new_user = User(
         name=teacher.name,
         email=teacher.email,
-        password_hash=get_password_hash(teacher.password),
+        password_hash=password_hasher.hash_sync(teacher.password),
         role=RoleEnum.teacher,
-        school_id=current_user.school_id
+        school_id=current_user.school_id,
+        is_default_password=teacher.password == teacher.name
     )
     db.add(new_user)
     db.flush() 
@@ -47,6 +58,7 @@ def add_teacher(teacher: TeacherCreate, current_user: User = Depends(get_current
         subject_specialization=teacher.subject_specialization
     )
     db.add(new_teacher)
+    school_stats.bump(db, current_user.school_id, teachers=1)
     db.commit()
     db.refresh(new_teacher)
     
@@ -57,10 +69,10 @@ def add_teacher(teacher: TeacherCreate, current_user: User = Depends(get_current
     }
 
 @router.get("/teachers")
-def list_teachers(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def list_teachers(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     check_role(current_user, [RoleEnum.school_admin])
     
-    results = db.query(
+    results = (await db.execute(select(
         Teacher.id,
         User.name,
         User.email,
@@ -69,8 +81,8 @@ def list_teachers(current_user: User = Depends(get_current_user), db: Session =
         func.count(Student.id).label("student_count")
     ).join(User, Teacher.user_id == User.id)\
      .outerjoin(Student, Teacher.id == Student.teacher_id)\
-     .filter(Teacher.school_id == current_user.school_id)\
-     .group_by(Teacher.id).all()
+     .where(Teacher.school_id == current_user.school_id)\
+     .group_by(Teacher.id))).all()
      
     return [
         {
@@ -84,7 +96,7 @@ def list_teachers(current_user: User = Depends(get_current_user), db: Session =
     ]
 
 @router.put("/toggle-teacher/{teacher_id}")
-def toggle_teacher_active(teacher_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def toggle_teacher_active(teacher_id: int, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     check_role(current_user, [RoleEnum.school_admin])
     
     teacher = db.query(Teacher).filter(Teacher.id == teacher_id, Teacher.school_id == current_user.school_id).first()
@@ -94,10 +106,11 @@ def toggle_teacher_active(teacher_id: int, current_user: User = Depends(get_curr
     user = db.query(User).filter(User.id == teacher.user_id).first()
     user.is_active = not user.is_active
     db.commit()
+    principal_cache.invalidate_user(user.id)
     return {"message": f"Teacher account {'activated' if user.is_active else 'deactivated'} successfully", "is_active": user.is_active}
 
 @router.delete("/teacher/{teacher_id}")
-def delete_teacher(teacher_id: int, data: TeacherDeleteRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_teacher(teacher_id: int, data: TeacherDeleteRequest, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     check_role(current_user, [RoleEnum.school_admin])
     
     teacher = db.query(Teacher).filter(Teacher.id == teacher_id, Teacher.school_id == current_user.school_id).first()
@@ -112,79 +125,85 @@ def delete_teacher(teacher_id: int, data: TeacherDeleteRequest, current_user: Us
             raise HTTPException(status_code=404, detail="Target teacher not found")
         db.query(Student).filter(Student.teacher_id == teacher_id).update({"teacher_id": data.reassign_to_id})
     else:
-        db.query(Student).filter(Student.teacher_id == teacher_id).delete()
+        # Marks go explicitly rather than via the FK cascade so the school counters and rollups stay exact
+        analytics.delete_student_marks(db, current_user.school_id, select(Student.id).where(Student.teacher_id == teacher_id))
+        deleted_students = db.query(Student).filter(Student.teacher_id == teacher_id).delete()
+        school_stats.bump(db, current_user.school_id, students=-deleted_students)
 
     user_id = teacher.user_id
     db.delete(teacher)
     db.query(User).filter(User.id == user_id).delete()
+    school_stats.bump(db, current_user.school_id, teachers=-1)
     db.commit()
+    tier_cache.invalidate_school(current_user.school_id)
+    principal_cache.invalidate_user(user_id)
     
     return {"message": "Teacher removed and students handled successfully"}
 
 @router.get("/students")
-def list_all_students(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def list_all_students(
+    response: Response,
+    class_name: Optional[str] = None,
+    teacher_id: Optional[int] = None,
+    page: PageParams = Depends(page_params),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
     check_role(current_user, [RoleEnum.school_admin])
-    results = db.query(
+    query = select(
         Student.id,
         Student.name.label("student_name"),
         Student.class_name,
         User.name.label("teacher_name")
     ).join(Teacher, Student.teacher_id == Teacher.id)\
      .join(User, Teacher.user_id == User.id)\
-     .filter(Student.school_id == current_user.school_id).all()
-    return results
+     .where(Student.school_id == current_user.school_id)
+    if class_name is not None:
+        query = query.where(Student.class_name == class_name)
+    if teacher_id is not None:
+        query = query.where(Student.teacher_id == teacher_id)
+    results = await apaginate(db, response, query, Student.id, page)
+    return [as_dict(r) for r in results]
 
-@router.get("/dashboard")
-def get_school_dashboard(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.get("/dashboard", dependencies=[Depends(etags.conditional("school-dashboard"))])
+async def get_school_dashboard(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     check_role(current_user, [RoleEnum.school_admin])
-    sid = current_user.school_id
-    
-    total_teachers = db.query(Teacher).filter(Teacher.school_id == sid).count()
-    total_students = db.query(Student).filter(Student.school_id == sid).count()
-    
-    avg_marks = db.query(func.avg(Marks.mid_term + Marks.final_term + Marks.assignment)).filter(Marks.school_id == sid).scalar()
-    
-    grade_dist_raw = db.query(Marks.grade, func.count(Marks.id)).filter(Marks.school_id == sid).group_by(Marks.grade).all()
-    grade_dist = {g: count for g, count in grade_dist_raw}
-    
-    at_risk_count = db.query(Student.id).join(Marks, Student.id == Marks.student_id)\
-        .filter(Student.school_id == sid)\
-        .group_by(Student.id)\
-        .having(func.avg(Marks.mid_term + Marks.final_term + Marks.assignment) < 50).count()
-    
-    top_performers = db.query(
-        Student.name,
-        func.avg(Marks.mid_term + Marks.final_term + Marks.assignment).label("avg_score")
-    ).join(Marks, Student.id == Marks.student_id)\
-     .filter(Student.school_id == sid)\
-     .group_by(Student.id)\
-     .order_by(func.avg(Marks.mid_term + Marks.final_term + Marks.assignment).desc())\
-     .limit(5).all()
-
-    # Teacher Performance (Class Average per Teacher)
-    teacher_perf_raw = db.query(
-        User.name,
-        func.avg(Marks.total).label("avg_score")
-    ).join(Teacher, User.id == Teacher.user_id)\
-     .join(Student, Teacher.id == Student.teacher_id)\
-     .join(Marks, Student.id == Marks.student_id)\
-     .filter(Teacher.school_id == sid)\
-     .group_by(Teacher.id).all()
-
+    # Counters and rollups are kept up to date on every write (services/analytics.py)
+    snapshot = await analytics.get_snapshot(db, current_user.school_id)
     return {
-        "total_teachers": total_teachers,
-        "total_students": total_students,
-        "average_marks": round(float(avg_marks), 2) if avg_marks else 0,
-        "grade_distribution": grade_dist,
-        "at_risk_count": at_risk_count,
-        "top_performers": [{"name": p.name, "score": round(float(p.avg_score), 2)} for p in top_performers],
-        "teacher_performance": [{"teacher_name": p.name, "avg_score": round(float(p.avg_score), 2)} for p in teacher_perf_raw]
+        "total_teachers": snapshot["total_teachers"],
+        "total_students": snapshot["total_students"],
+        "average_marks": snapshot["average_marks"],
+        "grade_distribution": {g["grade"]: g["count"] for g in snapshot["grade_distribution"]},
+        "at_risk_count": snapshot["at_risk_count"],
+        "top_performers": snapshot["top_performers"],
+        "teacher_performance": snapshot["teacher_performance"]
     }
 
-@router.get("/reports")
-def get_school_marks_report(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.get("/report-cards")
+async def get_school_report_cards(
+    class_name: Optional[str] = None,
+    teacher_id: Optional[int] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
+):
     check_role(current_user, [RoleEnum.school_admin])
-    results = db.query(
+    criteria = [Student.school_id == current_user.school_id]
+    if class_name is not None:
+        criteria.append(Student.class_name == class_name)
+    if teacher_id is not None:
+        criteria.append(Student.teacher_id == teacher_id)
+    cards = await report_cards.load_cards(db, *criteria)
+    if not cards:
+        raise HTTPException(status_code=404, detail="No students found")
+    return Response(
+        content=await report_cards.render_zip(cards),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="report_cards.zip"'}
+    )
+
+def _report_query(school_id: int, class_name, subject_id, teacher_id, grade):
+    query = select(
         Student.name.label("student"),
         Student.class_name,
         Subject.name.label("subject"),
@@ -198,5 +217,62 @@ def get_school_marks_report(current_user: User = Depends(get_current_user), db:
      .join(Subject, Marks.subject_id == Subject.id)\
      .join(Teacher, Student.teacher_id == Teacher.id)\
      .join(User, Teacher.user_id == User.id)\
-     .filter(Student.school_id == current_user.school_id).all()
-    return results
+     .where(Student.school_id == school_id)
+    if class_name is not None:
+        query = query.where(Student.class_name == class_name)
+    if subject_id is not None:
+        query = query.where(Marks.subject_id == subject_id)
+    if teacher_id is not None:
+        query = query.where(Student.teacher_id == teacher_id)
+    if grade is not None:
+        query = query.where(Marks.grade == grade)
+    return query
+
+REPORT_COLUMNS = ["student", "class_name", "subject", "mid_term", "final_term", "assignment", "total", "grade", "teacher"]
+REPORT_NUMERIC = ("mid_term", "final_term", "assignment", "total")
+
+def _export_row(r) -> dict:
+    return {
+        "student": r.student,
+        "class_name": r.class_name,
+        "subject": r.subject,
+        "mid_term": float(r.mid_term or 0),
+        "final_term": float(r.final_term or 0),
+        "assignment": float(r.assignment or 0),
+        "total": float(r.total) if r.total is not None else None,
+        "grade": r.grade,
+        "teacher": r.teacher
+    }
+
+@router.get("/reports", dependencies=[Depends(etags.conditional("school-reports"))])
+async def get_school_marks_report(
+    response: Response,
+    class_name: Optional[str] = None,
+    subject_id: Optional[int] = None,
+    teacher_id: Optional[int] = None,
+    grade: Optional[str] = None,
+    format: str = "json",
+    page: PageParams = Depends(page_params),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    check_role(current_user, [RoleEnum.school_admin])
+    check_format(format)
+    query = _report_query(current_user.school_id, class_name, subject_id, teacher_id, grade)
+    results = await apaginate(db, response, query, Marks.id, page)
+    if format != "json":
+        return columnar_response(REPORT_COLUMNS, results, format, REPORT_NUMERIC, response.headers)
+    return [as_dict(r) for r in results]
+
+@router.get("/reports/export")
+async def export_school_marks_report(
+    format: str = "csv",
+    class_name: Optional[str] = None,
+    subject_id: Optional[int] = None,
+    teacher_id: Optional[int] = None,
+    grade: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user)
+):
+    check_role(current_user, [RoleEnum.school_admin])
+    query = _report_query(current_user.school_id, class_name, subject_id, teacher_id, grade)
+    return export_response(query.order_by(Marks.id), _export_row, REPORT_COLUMNS, format, "school_report")
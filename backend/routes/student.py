@@ -1,17 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from pydantic import BaseModel
-from database import get_db
+from database import get_async_db, get_async_read_db, get_read_db
 from models.user import User, RoleEnum
 from models.student import Student
 from models.marks import Marks
 from models.subject import Subject
-from models.school import School
-from models.teacher import Teacher
-from auth.jwt_handler import get_current_user, check_role, get_password_hash
-from ml.predict import predict_grade
-from ml.cluster import cluster_students
+from models.school_stats import SchoolStats
+from auth.jwt_handler import get_current_user, check_role, password_hasher, Principal
+from ml.predict import predict_grades
+from ml import tier_cache
+from auth import principal_cache
+from ml.cluster import classify_total
+from services import report_cards
+from services import etags
 
 router = APIRouter()
 
@@ -27,15 +31,15 @@ def calculate_grade(total_score: float) -> str:
     elif total_score >= 50: return "D"
     else: return "F"
 
-@router.get("/my-marks")
-def get_my_marks(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.get("/my-marks", dependencies=[Depends(etags.conditional("my-marks", per_student=True))])
+async def get_my_marks(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
     check_role(current_user, [RoleEnum.student])
     
-    student = db.query(Student).filter(Student.user_id == current_user.id).first()
-    if not student:
+    student_id = current_user.student_id
+    if not student_id:
         raise HTTPException(status_code=404, detail="Student record not found")
         
-    marks = db.query(
+    marks = (await db.execute(select(
         Subject.name.label("subject_name"),
         Marks.mid_term,
         Marks.final_term,
@@ -43,23 +47,23 @@ def get_my_marks(current_user: User = Depends(get_current_user), db: Session = D
         Marks.total,
         Marks.grade
     ).join(Subject, Marks.subject_id == Subject.id)\
-     .filter(Marks.student_id == student.id).all()
+     .where(Marks.student_id == student_id))).all()
      
-    return marks
+    return [m._asdict() for m in marks]
 
 @router.get("/my-dashboard")
-def get_my_dashboard(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_my_dashboard(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
     check_role(current_user, [RoleEnum.student])
     
-    student = db.query(Student).filter(Student.user_id == current_user.id).first()
-    if not student:
+    student_id = current_user.student_id
+    if not student_id:
         raise HTTPException(status_code=404, detail="Student record not found")
         
-    marks = db.query(
+    marks = (await db.execute(select(
         Subject.name.label("subject"),
         Marks.total
     ).join(Subject, Marks.subject_id == Subject.id)\
-     .filter(Marks.student_id == student.id).all()
+     .where(Marks.student_id == student_id))).all()
      
     if not marks:
         return {
@@ -76,27 +80,24 @@ def get_my_dashboard(current_user: User = Depends(get_current_user), db: Session
     best = max(marks, key=lambda x: x.total or 0)
     weakest = min(marks, key=lambda x: x.total or 0)
     
-    # ML Tiering
-    all_students_in_school = db.query(
-        Student.id,
-        Student.name,
-        func.avg(Marks.total).label("avg_total")
-    ).join(Marks, Student.id == Marks.student_id)\
-     .filter(Student.school_id == student.school_id)\
-     .group_by(Student.id).all()
-     
-    cluster_data = [
-        {"id": s.id, "name": s.name, "total": float(s.avg_total or 0)} 
-        for s in all_students_in_school
-    ]
-    
-    tier = "Unknown"
-    if cluster_data:
-        clusters = cluster_students(cluster_data)
-        for c in clusters:
-            if c["id"] == student.id:
-                tier = c["performance_label"]
-                break
+    # ML Tiering (cached per school, refitted only after marks change)
+    async def load_school_totals():
+        all_students_in_school = (await db.execute(select(
+            Student.id,
+            Student.name,
+            func.avg(Marks.total).label("avg_total")
+        ).join(Marks, Student.id == Marks.student_id)\
+         .where(Student.school_id == current_user.school_id)\
+         .group_by(Student.id))).all()
+        return [
+            {"id": s.id, "name": s.name, "total": float(s.avg_total or 0)} 
+            for s in all_students_in_school
+        ]
+
+    # Same school data version /ml/clusters keys on, so writes made on other workers refit straight away
+    data_version = await db.scalar(select(SchoolStats.data_version).where(SchoolStats.school_id == current_user.school_id))
+    tiers = await tier_cache.aget_tiers(tier_cache.school_scope(current_user.school_id), load_school_totals, data_version)
+    tier = tiers.labels.get(student_id) or classify_total(avg, tiers.model)
 
     return {
         "average_marks": float(f"{avg:.2f}"),
@@ -107,11 +108,10 @@ def get_my_dashboard(current_user: User = Depends(get_current_user), db: Session
     }
 
 @router.get("/my-prediction")
-def get_my_prediction(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_my_prediction(current_user: Principal = Depends(get_current_user), db: Session = Depends(get_read_db)):
     check_role(current_user, [RoleEnum.student])
     
-    student = db.query(Student).filter(Student.user_id == current_user.id).first()
-    if not student:
+    if not current_user.student_id:
         raise HTTPException(status_code=404, detail="Student record not found")
         
     marks = db.query(
@@ -119,59 +119,58 @@ def get_my_prediction(current_user: User = Depends(get_current_user), db: Sessio
         Marks.mid_term,
         Marks.assignment
     ).join(Subject, Marks.subject_id == Subject.id)\
-     .filter(Marks.student_id == student.id).all()
+     .filter(Marks.student_id == current_user.student_id).all()
      
+    # Score every subject in one model call
+    result = predict_grades(
+        [float(m.mid_term or 0) for m in marks],
+        [float(m.assignment or 0) for m in marks],
+        current_user.school_id
+    )
+    preds = result.get("predictions", [{}] * len(marks))
+
     predictions = []
-    for m in marks:
-        pred = predict_grade(float(m.mid_term or 0), float(m.assignment or 0))
+    for m, pred in zip(marks, preds):
         predictions.append({
             "subject": m.subject_name,
             "predicted_grade": pred.get("predicted_grade", "N/A"),
-            "confidence": pred.get("confidence_percentage", 0)
+            "confidence": pred.get("confidence_percentage", 0),
+            "model_version": result.get("model_version")
         })
         
     return predictions
 
 @router.post("/change-password")
-def change_my_password(data: PasswordChangeRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    current_user.password_hash = get_password_hash(data.new_password)
-    db.commit()
+async def change_my_password(data: PasswordChangeRequest, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(User, current_user.id)
+    user.password_hash = await password_hasher.hash(data.new_password)
+    user.is_default_password = data.new_password == user.name
+    await db.commit()
+    principal_cache.invalidate_user(user.id)
     return {"message": "Password updated successfully"}
 
 @router.get("/my-report-pdf")
-def get_my_report_pdf_data(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_my_report_pdf_data(format: str = "json", current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
     check_role(current_user, [RoleEnum.student])
     
-    student = db.query(Student).filter(Student.user_id == current_user.id).first()
-    if not student:
+    cards = await report_cards.load_cards(db, Student.id == current_user.student_id) if current_user.student_id else []
+    if not cards:
         raise HTTPException(status_code=404, detail="Student record not found")
+    card = cards[0]
 
-    teacher_user = db.query(User).join(Teacher, User.id == Teacher.user_id).filter(Teacher.id == student.teacher_id).first()
-    school = db.query(School).filter(School.id == student.school_id).first()
-    
-    marks_data = db.query(
-        Subject.name.label("subject"),
-        Marks.mid_term,
-        Marks.final_term,
-        Marks.assignment,
-        Marks.total,
-        Marks.grade
-    ).join(Subject, Marks.subject_id == Subject.id)\
-     .filter(Marks.student_id == student.id).all()
+    # format=pdf returns the rendered report card (cached until the marks change)
+    if format == "pdf":
+        pdf = (await report_cards.render([card]))[0]
+        return Response(
+            content=pdf,
+            media_type="application/pdf",
+            headers={"Content-Disposition": f'attachment; filename="{report_cards.file_name(card)}"'}
+        )
      
     return {
-        "student_name": student.name,
-        "class": student.class_name,
-        "teacher": teacher_user.name if teacher_user else "Unknown",
-        "school": school.name if school else "Unknown",
-        "results": [
-            {
-                "subject": r.subject,
-                "mid_term": float(r.mid_term),
-                "final_term": float(r.final_term),
-                "assignment": float(r.assignment),
-                "total": float(r.total),
-                "grade": r.grade
-            } for r in marks_data
-        ]
+        "student_name": card["student_name"],
+        "class": card["class"],
+        "teacher": card["teacher"],
+        "school": card["school"],
+        "results": card["results"]
     }
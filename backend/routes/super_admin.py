@@ -1,12 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from pydantic import BaseModel, EmailStr
-from database import get_db
+from typing import Optional
+from database import get_db, get_async_db, pool_stats
 from models.user import User, RoleEnum
 from models.school import School
-from models.teacher import Teacher
-from models.student import Student
-from auth.jwt_handler import get_current_user, check_role, get_password_hash
+from models.school_stats import SchoolStats
+from models.student_mark_stats import StudentMarkStats
+from models.school_mark_rollup import SchoolMarkRollup
+from models.school_analytics import SchoolAnalytics
+from auth.jwt_handler import get_current_user, check_role, password_hasher, Principal
+from auth import principal_cache
+from services.pagination import PageParams, page_params, paginate
 
 router = APIRouter()
 
@@ -27,11 +34,13 @@ class DeleteConfirmation(BaseModel):
     confirm: bool
 
 @router.post("/add-school", status_code=status.HTTP_201_CREATED)
-def add_school(school: SchoolCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def add_school(school: SchoolCreate, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     check_role(current_user, [RoleEnum.super_admin])
     
     new_school = School(**school.dict())
     db.add(new_school)
+    db.flush()
+    db.add(SchoolStats(school_id=new_school.id, teacher_count=0, student_count=0, mark_count=0))
     db.commit()
     db.refresh(new_school)
     return {
@@ -40,27 +49,24 @@ def add_school(school: SchoolCreate, current_user: User = Depends(get_current_us
     }
 
 @router.get("/schools")
-def list_schools(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def list_schools(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     check_role(current_user, [RoleEnum.super_admin])
     
-    schools = db.query(School).all()
-    results = []
-    for s in schools:
-        teacher_count = db.query(Teacher).filter(Teacher.school_id == s.id).count()
-        student_count = db.query(Student).filter(Student.school_id == s.id).count()
-        results.append({
-            "id": s.id,
-            "name": s.name,
-            "address": s.address,
-            "email": s.email,
-            "phone": s.phone,
-            "teacher_count": teacher_count,
-            "student_count": student_count
-        })
-    return results
+    # Counts come from school_stats, so this is one scan joined on its primary key
+    schools = (await db.execute(select(
+        School.id,
+        School.name,
+        School.address,
+        School.email,
+        School.phone,
+        func.coalesce(SchoolStats.teacher_count, 0).label("teacher_count"),
+        func.coalesce(SchoolStats.student_count, 0).label("student_count")
+    ).outerjoin(SchoolStats, SchoolStats.school_id == School.id)\
+     .order_by(School.id))).all()
+    return [s._asdict() for s in schools]
 
 @router.delete("/school/{school_id}")
-def delete_school(school_id: int, data: DeleteConfirmation, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_school(school_id: int, data: DeleteConfirmation, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     check_role(current_user, [RoleEnum.super_admin])
     
     if not data.confirm:
@@ -70,12 +76,15 @@ def delete_school(school_id: int, data: DeleteConfirmation, current_user: User =
     if not school:
         raise HTTPException(status_code=404, detail="School not found")
         
+    for summary in (SchoolStats, StudentMarkStats, SchoolMarkRollup, SchoolAnalytics):
+        db.query(summary).filter(summary.school_id == school_id).delete()
     db.delete(school)
     db.commit()
+    principal_cache.invalidate_school(school_id)
     return {"message": f"School and all associated data deleted successfully"}
 
 @router.post("/add-school-admin", status_code=status.HTTP_201_CREATED)
-def add_school_admin(admin: SchoolAdminCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def add_school_admin(admin: SchoolAdminCreate, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     check_role(current_user, [RoleEnum.super_admin])
     
     school = db.query(School).filter(School.id == admin.school_id).first()
@@ -89,9 +98,10 @@ def add_school_admin(admin: SchoolAdminCreate, current_user: User = Depends(get_
     new_user = User(
         name=admin.name,
         email=admin.email,
-        password_hash=get_password_hash(admin.password),
+        password_hash=password_hasher.hash_sync(admin.password),
         role=RoleEnum.school_admin,
-        school_id=admin.school_id
+        school_id=admin.school_id,
+        is_default_password=admin.password == admin.name
     )
     db.add(new_user)
     db.commit()
@@ -106,16 +116,28 @@ def add_school_admin(admin: SchoolAdminCreate, current_user: User = Depends(get_
     }
 
 @router.get("/all-users")
-def get_all_users(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_all_users(
+    response: Response,
+    role: Optional[RoleEnum] = None,
+    school_id: Optional[int] = None,
+    page: PageParams = Depends(page_params),
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     check_role(current_user, [RoleEnum.super_admin])
     
-    users = db.query(User, School.name.label("school_name"))\
-        .outerjoin(School, User.school_id == School.id).all()
+    query = select(User.id, User.name, User.email, User.role, User.is_active, School.name.label("school_name"))\
+        .outerjoin(School, User.school_id == School.id)
+    if role is not None:
+        query = query.where(User.role == role)
+    if school_id is not None:
+        query = query.where(User.school_id == school_id)
+    users = paginate(db, response, query, User.id, page)
         
-    # Grouping by school
+    # Grouping by school (within the page when paginated)
     grouped = {}
-    for u, school_name in users:
-        s_name = school_name or "Platform"
+    for u in users:
+        s_name = u.school_name or "Platform"
         if s_name not in grouped:
             grouped[s_name] = []
         grouped[s_name].append({
@@ -128,7 +150,7 @@ def get_all_users(current_user: User = Depends(get_current_user), db: Session =
     return grouped
 
 @router.put("/toggle-user/{user_id}")
-def toggle_user_status(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def toggle_user_status(user_id: int, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     check_role(current_user, [RoleEnum.super_admin])
     
     user = db.query(User).filter(User.id == user_id).first()
@@ -140,18 +162,29 @@ def toggle_user_status(user_id: int, current_user: User = Depends(get_current_us
 
     user.is_active = not user.is_active
     db.commit()
+    principal_cache.invalidate_user(user.id)
     return {"message": f"User {'activated' if user.is_active else 'deactivated'} successfully"}
+
 @router.get("/dashboard")
-def get_super_admin_dashboard(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_super_admin_dashboard(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     check_role(current_user, [RoleEnum.super_admin])
     
-    total_schools = db.query(School).count()
-    total_teachers = db.query(Teacher).count()
-    total_students = db.query(Student).count()
+    # Sums over school_stats (one row per school) instead of counting every teacher/student
+    totals = (await db.execute(select(
+        func.count(School.id).label("total_schools"),
+        func.coalesce(func.sum(SchoolStats.teacher_count), 0).label("total_teachers"),
+        func.coalesce(func.sum(SchoolStats.student_count), 0).label("total_students")
+    ).outerjoin(SchoolStats, SchoolStats.school_id == School.id))).one()
     
     # Recent activity or other stats can be added here
     return {
-        "total_schools": total_schools,
-        "total_teachers": total_teachers,
-        "total_students": total_students
+        "total_schools": totals.total_schools,
+        "total_teachers": int(totals.total_teachers),
+        "total_students": int(totals.total_students)
     }
+
+@router.get("/pool-stats")
+def get_pool_stats(current_user: Principal = Depends(get_current_user)):
+    check_role(current_user, [RoleEnum.super_admin])
+    # Per worker process: each has its own pools
+    return pool_stats()
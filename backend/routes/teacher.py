@@ -1,17 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Response, status, UploadFile, File
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 import csv
 import io
-from database import get_db
+from database import get_db, get_async_db, get_async_read_db
 from models.user import User, RoleEnum
-from models.teacher import Teacher
 from models.student import Student
 from models.marks import Marks
 from models.subject import Subject
-from auth.jwt_handler import get_current_user, check_role, get_password_hash
+from auth.jwt_handler import get_current_user, check_role, Principal
+from ml import tier_cache, retrain
+from auth import principal_cache
+from services import school_stats, analytics
+from services.roster import create_students
+from services.marks import upsert_marks
+from services.pagination import PageParams, page_params, apaginate
+from services import report_cards
+from services.columnar import check_format, columnar_response
+from services import etags
 
 router = APIRouter()
 
@@ -41,118 +50,105 @@ def calculate_grade(total):
     else: return "F"
 
 @router.post("/add-student", status_code=status.HTTP_201_CREATED)
-def add_student(student_data: StudentCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def add_student(student_data: StudentCreate, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     check_role(current_user, [RoleEnum.teacher])
-    teacher = db.query(Teacher).filter(Teacher.user_id == current_user.id).first()
-    if not teacher:
+    if not current_user.teacher_id:
         raise HTTPException(status_code=404, detail="Teacher record not found")
 
-    email = student_data.name.lower().replace(" ", "") + "@school.com"
-    password = student_data.name # full name as-is
-    
-    # Check email collision
-    if db.query(User).filter(User.email == email).first():
-        count = db.query(User).filter(User.email.like(f"{email.split('@')[0]}%")).count()
-        email = f"{email.split('@')[0]}{count}@school.com"
-
-    new_user = User(
-        name=student_data.name,
-        email=email,
-        password_hash=get_password_hash(password),
-        role=RoleEnum.student,
-        school_id=current_user.school_id
-    )
-    db.add(new_user)
-    db.flush()
-    
-    new_student = Student(
-        user_id=new_user.id,
-        teacher_id=teacher.id,
-        school_id=current_user.school_id,
-        name=student_data.name,
-        age=student_data.age,
-        gender=student_data.gender,
-        class_name=student_data.class_name
-    )
-    db.add(new_student)
+    # Login email from the name, password is the full name as-is
+    creds = create_students(db, [{
+        "name": student_data.name,
+        "age": student_data.age,
+        "gender": student_data.gender,
+        "class_name": student_data.class_name
+    }], current_user.teacher_id, current_user.school_id)[0]
     db.commit()
     
     return {
         "student_name": student_data.name,
-        "login_email": email,
-        "login_password": password,
+        "login_email": creds["email"],
+        "login_password": creds["password"],
         "message": "Student created successfully"
     }
 
+# Rows per bulk insert / hashing batch for CSV imports
+IMPORT_CHUNK_SIZE = 500
+
+# Plain def: the ORM work and bcrypt below are blocking, so this runs in the threadpool
 @router.post("/add-students-csv")
-async def add_students_csv(file: UploadFile = File(...), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def add_students_csv(file: UploadFile = File(...), current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     check_role(current_user, [RoleEnum.teacher])
-    teacher = db.query(Teacher).filter(Teacher.user_id == current_user.id).first()
-    if not teacher:
+    if not current_user.teacher_id:
         raise HTTPException(status_code=404, detail="Teacher record not found")
         
-    content = await file.read()
-    decoded = content.decode("utf-8")
-    io_string = io.StringIO(decoded)
-    reader = csv.DictReader(io_string)
+    # Parse the upload incrementally instead of decoding it into one string
+    reader = csv.DictReader(io.TextIOWrapper(file.file, encoding="utf-8-sig", newline=""))
     
     creds = []
-    created_count = 0
-    
-    for row in reader:
-        name = row.get("name")
-        if not name: continue
-        
-        email = name.lower().replace(" ", "") + "@school.com"
-        password = name
-        
-        # Simple collision check
-        if db.query(User).filter(User.email == email).first():
-            email = f"{name.lower().replace(' ', '')}{created_count + 1}@school.com"
+    errors = []
+    reserved = set()
+    chunk = []
 
-        new_user = User(
-            name=name,
-            email=email,
-            password_hash=get_password_hash(password),
-            role=RoleEnum.student,
-            school_id=current_user.school_id
-        )
-        db.add(new_user)
-        db.flush()
-        
-        new_student = Student(
-            user_id=new_user.id,
-            teacher_id=teacher.id,
-            school_id=current_user.school_id,
-            name=name,
-            age=int(row.get("age", 0)) if row.get("age") else None,
-            gender=row.get("gender"),
-            class_name=row.get("class")
-        )
-        db.add(new_student)
-        creds.append({"name": name, "email": email, "password": password})
-        created_count += 1
+    def flush():
+        creds.extend(create_students(db, chunk, current_user.teacher_id, current_user.school_id, reserved))
+        chunk.clear()
+
+    try:
+        for row in reader:
+            # Header is line 1
+            line = reader.line_num
+            name = (row.get("name") or "").strip()
+            if not name:
+                errors.append({"row": line, "error": "Missing name"})
+                continue
+
+            age = (row.get("age") or "").strip()
+            if age and not age.isdigit():
+                errors.append({"row": line, "error": f"Invalid age: {age}"})
+                continue
+
+            chunk.append({
+                "name": name,
+                "age": int(age) if age else None,
+                "gender": row.get("gender") or None,
+                "class_name": row.get("class") or None
+            })
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                flush()
+        flush()
+    except UnicodeDecodeError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="CSV file must be UTF-8 encoded")
     
     db.commit()
-    return {"created_count": created_count, "credentials": creds}
+    return {"created_count": len(creds), "credentials": creds, "errors": errors}
 
-@router.get("/my-students")
-def get_my_students(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.get("/my-students", dependencies=[Depends(etags.conditional("my-students"))])
+async def get_my_students(
+    response: Response,
+    class_name: Optional[str] = None,
+    page: PageParams = Depends(page_params),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
     check_role(current_user, [RoleEnum.teacher])
-    teacher = db.query(Teacher).filter(Teacher.user_id == current_user.id).first()
-    if not teacher:
+    teacher_id = current_user.teacher_id
+    if not teacher_id:
         return []
     
     # Query students + average of their marks to determine tier
-    results = db.query(
+    query = select(
         Student.id,
         Student.name,
         Student.class_name,
         func.sum(Marks.total).label("total_marks"),
         func.avg(Marks.total).label("avg_marks")
     ).outerjoin(Marks, Student.id == Marks.student_id)\
-     .filter(Student.teacher_id == teacher.id)\
-     .group_by(Student.id).all()
+     .where(Student.teacher_id == teacher_id)\
+     .group_by(Student.id)
+    if class_name is not None:
+        query = query.where(Student.class_name == class_name)
+    results = await apaginate(db, response, query, Student.id, page)
      
     students = []
     for r in results:
@@ -170,11 +166,15 @@ def get_my_students(current_user: User = Depends(get_current_user), db: Session
     return students
 
 @router.put("/student/{student_id}")
-def update_student(student_id: int, student_data: StudentCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_student(student_id: int, student_data: StudentCreate, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     check_role(current_user, [RoleEnum.teacher])
-    teacher = db.query(Teacher).filter(Teacher.user_id == current_user.id).first()
-    
-    student = db.query(Student).filter(Student.id == student_id, Student.teacher_id == teacher.id).first()
+    if not current_user.teacher_id:
+        raise HTTPException(status_code=404, detail="Teacher record not found")
+    student = db.query(Student).filter(
+        Student.id == student_id,
+        Student.teacher_id == current_user.teacher_id,
+        Student.school_id == current_user.school_id
+    ).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found or not assigned to you")
     
@@ -182,75 +182,81 @@ def update_student(student_id: int, student_data: StudentCreate, current_user: U
     student.age = student_data.age
     student.gender = student_data.gender
     student.class_name = student_data.class_name
+    # Names show up in the school's analytics snapshot
+    school_stats.bump(db, student.school_id)
     db.commit()
+    tier_cache.invalidate_school(student.school_id)
     return {"message": "Student updated successfully"}
 
 @router.delete("/student/{student_id}")
-def delete_student(student_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_student(student_id: int, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     check_role(current_user, [RoleEnum.teacher])
-    teacher = db.query(Teacher).filter(Teacher.user_id == current_user.id).first()
-    
-    student = db.query(Student).filter(Student.id == student_id, Student.teacher_id == teacher.id).first()
+    if not current_user.teacher_id:
+        raise HTTPException(status_code=404, detail="Teacher record not found")
+    student = db.query(Student).filter(
+        Student.id == student_id,
+        Student.teacher_id == current_user.teacher_id,
+        Student.school_id == current_user.school_id
+    ).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found or not assigned to you")
     
     user_id = student.user_id
+    analytics.delete_student_marks(db, student.school_id, [student.id])
     db.delete(student)
     db.query(User).filter(User.id == user_id).delete()
+    school_stats.bump(db, student.school_id, students=-1)
     db.commit()
+    tier_cache.invalidate_school(current_user.school_id)
+    principal_cache.invalidate_user(user_id)
     return {"message": "Student and associated user account removed successfully"}
 
 @router.post("/add-marks")
-def add_marks(data: BulkMarkAddRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def add_marks(data: BulkMarkAddRequest, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     check_role(current_user, [RoleEnum.teacher])
-    teacher = db.query(Teacher).filter(Teacher.user_id == current_user.id).first()
-    if not teacher:
+    if not current_user.teacher_id:
         raise HTTPException(status_code=404, detail="Teacher record not found")
     
-    for mark_item in data.marks:
-        student = db.query(Student).filter(Student.id == mark_item.student_id, Student.teacher_id == teacher.id).first()
-        if not student:
-            continue
-        
-        total = round(mark_item.mid_term + mark_item.final_term + mark_item.assignment, 2)
-        grade = calculate_grade(total)
-        
-        # Upsert: update existing or insert new
-        existing_mark = db.query(Marks).filter(
-            Marks.student_id == mark_item.student_id,
-            Marks.subject_id == mark_item.subject_id
-        ).first()
-        
-        if existing_mark:
-            existing_mark.mid_term = mark_item.mid_term
-            existing_mark.final_term = mark_item.final_term
-            existing_mark.assignment = mark_item.assignment
-            existing_mark.total = total
-            existing_mark.grade = grade
-        else:
-            new_mark = Marks(
-                student_id=mark_item.student_id,
-                subject_id=mark_item.subject_id,
-                school_id=current_user.school_id,
-                mid_term=mark_item.mid_term,
-                final_term=mark_item.final_term,
-                assignment=mark_item.assignment,
-                total=total,
-                grade=grade
-            )
-            db.add(new_mark)
+    # Validate every student in one query; marks for other teachers' students are skipped
+    requested_ids = {m.student_id for m in data.marks}
+    own_ids = set(db.scalars(
+        select(Student.id).where(Student.id.in_(requested_ids), Student.teacher_id == current_user.teacher_id)
+    ))
+    items = [m.model_dump() for m in data.marks if m.student_id in own_ids]
+    
+    # Single multi-row upsert on (student_id, subject_id)
+    processed = upsert_marks(db, current_user.school_id, items)
             
     db.commit()
-    return {"message": "Marks processed successfully"}
+    tier_cache.invalidate_school(current_user.school_id)
+    retrain.note_marks_changed(processed)
+    return {
+        "message": "Marks processed successfully",
+        "processed": processed,
+        "skipped_student_ids": sorted(requested_ids - own_ids)
+    }
+
+REPORT_COLUMNS = ["student_name", "subject", "mid_term", "final_term", "assignment", "total", "grade"]
+REPORT_NUMERIC = ("mid_term", "final_term", "assignment", "total")
 
-@router.get("/my-report")
-def get_teacher_report(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.get("/my-report", dependencies=[Depends(etags.conditional("my-report"))])
+async def get_teacher_report(
+    response: Response,
+    class_name: Optional[str] = None,
+    subject_id: Optional[int] = None,
+    grade: Optional[str] = None,
+    format: str = "json",
+    page: PageParams = Depends(page_params),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
+):
     check_role(current_user, [RoleEnum.teacher])
-    teacher = db.query(Teacher).filter(Teacher.user_id == current_user.id).first()
-    if not teacher:
+    check_format(format)
+    teacher_id = current_user.teacher_id
+    if not teacher_id:
         return []
         
-    report = db.query(
+    query = select(
         Student.name.label("student_name"),
         Subject.name.label("subject"),
         Marks.mid_term,
@@ -260,7 +266,16 @@ def get_teacher_report(current_user: User = Depends(get_current_user), db: Sessi
         Marks.grade
     ).join(Marks, Student.id == Marks.student_id)\
      .join(Subject, Marks.subject_id == Subject.id)\
-     .filter(Student.teacher_id == teacher.id).all()
+     .where(Student.teacher_id == teacher_id)
+    if class_name is not None:
+        query = query.where(Student.class_name == class_name)
+    if subject_id is not None:
+        query = query.where(Marks.subject_id == subject_id)
+    if grade is not None:
+        query = query.where(Marks.grade == grade)
+    report = await apaginate(db, response, query, Marks.id, page)
+    if format != "json":
+        return columnar_response(REPORT_COLUMNS, report, format, REPORT_NUMERIC, response.headers)
      
     # Convert Decimals to Float and Rows to Dicts for JSON serialization
     return [
@@ -276,7 +291,25 @@ def get_teacher_report(current_user: User = Depends(get_current_user), db: Sessi
     ]
 
 @router.get("/subjects")
-def get_teacher_subjects(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_teacher_subjects(current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     check_role(current_user, [RoleEnum.teacher])
     subjects = db.query(Subject).filter(Subject.school_id == current_user.school_id).all()
     return subjects
+
+@router.get("/report-cards")
+async def get_class_report_cards(class_name: Optional[str] = None, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
+    check_role(current_user, [RoleEnum.teacher])
+    if not current_user.teacher_id:
+        raise HTTPException(status_code=404, detail="Teacher record not found")
+
+    criteria = [Student.teacher_id == current_user.teacher_id]
+    if class_name is not None:
+        criteria.append(Student.class_name == class_name)
+    cards = await report_cards.load_cards(db, *criteria)
+    if not cards:
+        raise HTTPException(status_code=404, detail="No students found")
+    return Response(
+        content=await report_cards.render_zip(cards),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="report_cards.zip"'}
+    )
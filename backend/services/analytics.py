@@ -0,0 +1,211 @@
+from collections import defaultdict, namedtuple
+from sqlalchemy import select, func, delete, insert, update, extract
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.user import User
+from models.teacher import Teacher
+from models.student import Student
+from models.subject import Subject
+from models.marks import Marks
+from models.school_stats import SchoolStats
+from models.student_mark_stats import StudentMarkStats
+from models.school_mark_rollup import SchoolMarkRollup
+from models.school_analytics import SchoolAnalytics
+from services.sql import upsert, aupsert
+from services import school_stats
+
+# Same cut-offs the dashboard has always used
+AT_RISK_AVERAGE = 50
+TOP_PERFORMERS = 5
+
+# What the rollups need to know about one marks row
+MarkFacts = namedtuple("MarkFacts", ["student_id", "subject_id", "total", "grade", "month"])
+
+# Select these to build MarkFacts from existing rows
+FACT_COLUMNS = (
+    Marks.student_id,
+    Marks.subject_id,
+    func.coalesce(Marks.total, Marks.mid_term + Marks.final_term + Marks.assignment),
+    Marks.grade,
+    Marks.created_at
+)
+
+def mark_facts(student_id, subject_id, total, grade, created_at) -> MarkFacts:
+    return MarkFacts(student_id, subject_id, float(total or 0), grade, created_at.month if created_at else None)
+
+def _rollup_keys(facts: MarkFacts):
+    return [
+        ("grade", facts.grade or ""),
+        ("subject", str(facts.subject_id)),
+        ("month", str(facts.month or ""))
+    ]
+
+def apply_changes(db: Session, school_id: int, changes: list, students: bool = True):
+    """Fold marks writes into the school's rollups; runs in the caller's transaction.
+
+    changes: (old, new) MarkFacts pairs, None on the side where no row exists
+    (inserts have no old, deletes have no new). Each rollup row gets one
+    atomic increment, and school_stats picks up the mark count change.
+    """
+    created = sum((new is not None) - (old is not None) for old, new in changes)
+    # school_stats first: its row lock orders this write against rebuild()
+    school_stats.bump(db, school_id, marks=created)
+
+    per_student = defaultdict(lambda: [0, 0.0])
+    per_key = defaultdict(lambda: [0, 0.0])
+    for old, new in changes:
+        for facts, sign in ((old, -1), (new, 1)):
+            if facts is None:
+                continue
+            per_student[facts.student_id][0] += sign
+            per_student[facts.student_id][1] += sign * facts.total
+            for key in _rollup_keys(facts):
+                per_key[key][0] += sign
+                per_key[key][1] += sign * facts.total
+
+    if students:
+        # Every touched student gets a new data_version, even if the sums net out
+        upsert(db, StudentMarkStats.__table__, [
+            {"student_id": sid, "school_id": school_id, "mark_count": n, "total_sum": round(s, 2), "data_version": 1}
+            for sid, (n, s) in per_student.items()
+        ], keys=["student_id"], increment_columns=["mark_count", "total_sum", "data_version"])
+    upsert(db, SchoolMarkRollup.__table__, [
+        {"school_id": school_id, "dimension": dim, "key": key, "mark_count": n, "total_sum": round(s, 2)}
+        for (dim, key), (n, s) in per_key.items() if n or round(s, 2)
+    ], keys=["school_id", "dimension", "key"], increment_columns=["mark_count", "total_sum"])
+
+def delete_student_marks(db: Session, school_id: int, student_ids) -> int:
+    """Delete all marks of the given students (ids or a subquery) and their rollups."""
+    rows = db.execute(select(*FACT_COLUMNS).where(Marks.student_id.in_(student_ids))).all()
+    db.execute(delete(StudentMarkStats).where(StudentMarkStats.student_id.in_(student_ids)))
+    apply_changes(db, school_id, [(mark_facts(*r), None) for r in rows], students=False)
+    db.execute(delete(Marks).where(Marks.student_id.in_(student_ids)).execution_options(synchronize_session=False))
+    return len(rows)
+
+def rebuild(db: Session, school_id: int):
+    """Recompute one school's rollups from its marks; the caller commits.
+
+    Scans the school's marks once per rollup, so it is for repairs and
+    backfills (reconcile_school_stats.py), not the request path.
+    """
+    # Marks writers bump school_stats before touching the rollups, so holding
+    # this row lock means the marks read below and the deltas never overlap
+    school_stats.bump(db, school_id)
+    # Student rows are zeroed and refilled rather than recreated so their
+    # data_version keeps counting up (it backs ETags)
+    db.execute(update(StudentMarkStats).where(StudentMarkStats.school_id == school_id).values(
+        mark_count=0, total_sum=0, data_version=StudentMarkStats.data_version + 1
+    ))
+    db.execute(delete(SchoolMarkRollup).where(SchoolMarkRollup.school_id == school_id))
+
+    total = FACT_COLUMNS[2]
+    in_school = Marks.school_id == school_id
+    per_student = db.execute(
+        select(Marks.student_id, func.count(), func.sum(total)).where(in_school).group_by(Marks.student_id)
+    ).all()
+    upsert(db, StudentMarkStats.__table__, [
+        {"student_id": sid, "school_id": school_id, "mark_count": n, "total_sum": s, "data_version": 1}
+        for sid, n, s in per_student
+    ], keys=["student_id"], update_columns=["mark_count", "total_sum"], increment_columns=["data_version"])
+
+    rollups = []
+    month = extract("month", Marks.created_at)
+    for dimension, column in (("grade", Marks.grade), ("subject", Marks.subject_id), ("month", month)):
+        for key, n, s in db.execute(select(column, func.count(), func.sum(total)).where(in_school).group_by(column)):
+            rollups.append({
+                "school_id": school_id,
+                "dimension": dimension,
+                "key": "" if key is None else str(int(key)) if dimension == "month" else str(key),
+                "mark_count": n,
+                "total_sum": s
+            })
+    if rollups:
+        db.execute(insert(SchoolMarkRollup), rollups)
+
+async def _build_payload(db: AsyncSession, school_id: int) -> dict:
+    # Everything below reads rollup rows (one per student/grade/subject/month), never marks
+    rollups = (await db.execute(select(
+        SchoolMarkRollup.dimension, SchoolMarkRollup.key, SchoolMarkRollup.mark_count, SchoolMarkRollup.total_sum
+    ).where(SchoolMarkRollup.school_id == school_id, SchoolMarkRollup.mark_count > 0)\
+     .order_by(SchoolMarkRollup.dimension, SchoolMarkRollup.key))).all()
+
+    students = (await db.execute(select(
+        Student.name, Student.teacher_id, StudentMarkStats.mark_count, StudentMarkStats.total_sum
+    ).join(StudentMarkStats, StudentMarkStats.student_id == Student.id)\
+     .where(StudentMarkStats.school_id == school_id, StudentMarkStats.mark_count > 0))).all()
+
+    teachers = dict((await db.execute(select(Teacher.id, User.name)\
+        .join(User, Teacher.user_id == User.id)\
+        .where(Teacher.school_id == school_id)\
+        .order_by(Teacher.id))).all())
+    subjects = dict((await db.execute(select(Subject.id, Subject.name).where(Subject.school_id == school_id))).all())
+
+    mark_count = sum(s.mark_count for s in students)
+    total_sum = sum(float(s.total_sum) for s in students)
+    averages = [(s.name, float(s.total_sum) / s.mark_count) for s in students]
+
+    by_teacher = defaultdict(lambda: [0, 0.0])
+    for s in students:
+        if s.teacher_id in teachers:
+            by_teacher[s.teacher_id][0] += s.mark_count
+            by_teacher[s.teacher_id][1] += float(s.total_sum)
+    teacher_perf = [(teachers[tid], total / n) for tid, (n, total) in sorted(by_teacher.items())]
+
+    grades = []
+    subject_avg = []
+    trend = []
+    for r in rollups:
+        if r.dimension == "grade":
+            grades.append({"grade": r.key or None, "count": r.mark_count})
+        elif r.dimension == "subject" and int(r.key) in subjects:
+            subject_avg.append((subjects[int(r.key)], float(r.total_sum) / r.mark_count))
+        elif r.dimension == "month" and r.key:
+            trend.append({"month": int(r.key), "score": float(r.total_sum) / r.mark_count})
+    trend.sort(key=lambda t: t["month"])
+
+    return {
+        "average_marks": round(total_sum / mark_count, 2) if mark_count else 0,
+        "grade_distribution": grades,
+        "at_risk_count": sum(1 for _, avg in averages if avg < AT_RISK_AVERAGE),
+        "top_performers": [
+            {"name": name, "score": round(avg, 2)}
+            for name, avg in sorted(averages, key=lambda a: a[1], reverse=True)[:TOP_PERFORMERS]
+        ],
+        "teacher_performance": [{"teacher_name": name, "avg_score": round(avg, 2)} for name, avg in teacher_perf],
+        "lowest_subject": min(subject_avg, key=lambda a: a[1])[0] if subject_avg else "N/A",
+        "best_teacher": max(teacher_perf, key=lambda a: a[1])[0] if teacher_perf else "N/A",
+        "performance_trend": trend
+    }
+
+async def get_snapshot(db: AsyncSession, school_id: int) -> dict:
+    """Dashboard/insights figures for a school, normally in a single query.
+
+    The stored payload is served while its data_version matches the school's
+    counter; otherwise it is rebuilt from the rollups and stored again.
+    """
+    row = (await db.execute(select(
+        SchoolStats.teacher_count,
+        SchoolStats.student_count,
+        SchoolStats.data_version,
+        SchoolAnalytics.data_version.label("built_version"),
+        SchoolAnalytics.payload
+    ).outerjoin(SchoolAnalytics, SchoolAnalytics.school_id == SchoolStats.school_id)\
+     .where(SchoolStats.school_id == school_id))).first()
+
+    if row is None:
+        # School predates school_stats; reconcile_school_stats.py backfills it
+        return {
+            "total_teachers": await db.scalar(select(func.count(Teacher.id)).where(Teacher.school_id == school_id)),
+            "total_students": await db.scalar(select(func.count(Student.id)).where(Student.school_id == school_id)),
+            **await _build_payload(db, school_id)
+        }
+
+    payload = row.payload
+    if row.built_version != row.data_version:
+        payload = await _build_payload(db, school_id)
+        await aupsert(db, SchoolAnalytics.__table__, [
+            {"school_id": school_id, "data_version": row.data_version, "payload": payload}
+        ], keys=["school_id"], update_columns=["data_version", "payload"])
+        await db.commit()
+
+    return {"total_teachers": row.teacher_count, "total_students": row.student_count, **payload}
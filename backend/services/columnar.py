@@ -0,0 +1,38 @@
+import json
+from fastapi import HTTPException, Response
+
+# Opt-in encodings for the large report endpoints; "json" keeps the usual
+# array of objects and is handled by the routes themselves
+FORMATS = ("json", "columnar", "msgpack")
+
+def check_format(fmt: str):
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+
+def _floats(values: tuple) -> list:
+    return [None if v is None else float(v) for v in values]
+
+def columnar_response(columns: list, rows: list, fmt: str, numeric: tuple = (), headers=None) -> Response:
+    """Encode query result tuples column by column.
+
+    Body: {"columns": [...], "rows": n, "data": [[column 0 values], ...]}, as
+    JSON for format=columnar or MessagePack for format=msgpack. Rows are
+    transposed with zip() and only `numeric` (Decimal) columns are converted,
+    so no per-row dicts are built; extra trailing columns (e.g. the page key)
+    are dropped. Pass the route's injected response.headers as `headers` so
+    pagination/ETag headers set on it are kept.
+    """
+    headers = {k: v for k, v in (headers or {}).items() if k not in ("content-length", "content-type")}
+    data = [list(values) for values in zip(*rows)][:len(columns)] if rows else [[] for _ in columns]
+    for i, name in enumerate(columns):
+        if name in numeric:
+            data[i] = _floats(data[i])
+    body = {"columns": columns, "rows": len(rows), "data": data}
+
+    if fmt == "msgpack":
+        try:
+            import msgpack
+        except ImportError:
+            raise HTTPException(status_code=400, detail="msgpack is not installed on this server")
+        return Response(content=msgpack.packb(body), media_type="application/msgpack", headers=headers)
+    return Response(content=json.dumps(body, separators=(",", ":")), media_type="application/json", headers=headers)
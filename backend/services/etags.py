@@ -0,0 +1,54 @@
+import hashlib
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_read_db
+from models.school_stats import SchoolStats
+from models.student_mark_stats import StudentMarkStats
+from auth.jwt_handler import get_current_user, Principal
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]
+
+def conditional(scope: str, per_student: bool = False):
+    """Dependency adding a strong ETag to a GET route and answering If-None-Match.
+
+    The tag covers the route, the caller, the query string and the data
+    version: school_stats.data_version, or student_mark_stats.data_version for
+    per_student routes. Both are bumped in the same transaction as every
+    roster/marks write, so an unchanged tag means an unchanged body and the
+    304 goes out after one primary-key lookup, before the route's own queries.
+    The version is left on request.state.data_version for the route to use.
+
+    The lookup uses the read session, the same one read routes get, so a
+    lagging replica never pairs a newer tag with older content.
+    """
+    async def dependency(
+        request: Request,
+        response: Response,
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_read_db)
+    ):
+        if per_student:
+            version = await db.scalar(select(StudentMarkStats.data_version).where(
+                StudentMarkStats.student_id == current_user.student_id
+            )) if current_user.student_id else None
+        else:
+            version = await db.scalar(select(SchoolStats.data_version).where(
+                SchoolStats.school_id == current_user.school_id
+            ))
+        request.state.data_version = version
+        if version is None and not per_student:
+            # School predates school_stats (not reconciled yet): nothing to key on
+            return
+
+        query = hashlib.sha256(str(request.url.query).encode()).hexdigest()[:12]
+        etag = f'"{scope}-{current_user.id}-{version or 0}-{query}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if _matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
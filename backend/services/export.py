@@ -0,0 +1,54 @@
+import csv
+import io
+import json
+import os
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from database import AsyncReadSessionLocal
+
+# Rows fetched from the server-side cursor (and written out) per round trip
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+async def _batches(query, to_dict):
+    # Own session: the request's session is closed by the time the body streams.
+    # stream() + yield_per runs the query on an unbuffered cursor (SSCursor on
+    # MySQL), so only one batch is in memory however large the export is.
+    async with AsyncReadSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield [to_dict(r) for r in rows]
+
+async def _csv(query, to_dict, columns):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    writer.writeheader()
+    async for batch in _batches(query, to_dict):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+async def _ndjson(query, to_dict):
+    async for batch in _batches(query, to_dict):
+        yield "".join(json.dumps(row) + "\n" for row in batch)
+
+def export_response(query, to_dict, columns: list, fmt: str, filename: str) -> StreamingResponse:
+    """Stream `query` as CSV or NDJSON, converting each row with `to_dict`.
+
+    `to_dict` must return JSON-serialisable values keyed by `columns`.
+    """
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    body = _csv(query, to_dict, columns) if fmt == "csv" else _ndjson(query, to_dict)
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
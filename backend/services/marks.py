@@ -0,0 +1,78 @@
+import numpy as np
+from datetime import datetime
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+from models.marks import Marks
+from services.sql import upsert
+from services import analytics
+
+# Lower bounds of each grade band, highest first (same bands as calculate_grade)
+GRADE_BOUNDS = [90, 80, 70, 60, 50]
+GRADE_LABELS = ["A+", "A", "B", "C", "D"]
+
+# Rows per INSERT ... ON DUPLICATE KEY UPDATE statement
+UPSERT_CHUNK_SIZE = 1000
+
+def compute_totals_and_grades(items: list):
+    """Vectorized total and grade for a batch of mid_term/final_term/assignment dicts."""
+    scores = np.array(
+        [(i["mid_term"], i["final_term"], i["assignment"]) for i in items],
+        dtype=np.float64
+    ).reshape(-1, 3)
+    totals = np.round(scores.sum(axis=1), 2)
+    grades = np.select([totals >= b for b in GRADE_BOUNDS], GRADE_LABELS, default="F")
+    return totals.tolist(), grades.tolist()
+
+def upsert_marks(db: Session, school_id: int, items: list) -> int:
+    """Insert or update marks keyed on (student_id, subject_id); the caller commits.
+
+    Callers validate student/subject ownership first. Later items win when the
+    same student and subject appear twice in one batch.
+    """
+    latest = {}
+    for item in items:
+        latest[(item["student_id"], item["subject_id"])] = item
+    items = list(latest.values())
+    if not items:
+        return 0
+
+    totals, grades = compute_totals_and_grades(items)
+    rows = [
+        {
+            "student_id": item["student_id"],
+            "subject_id": item["subject_id"],
+            "school_id": school_id,
+            "mid_term": item["mid_term"],
+            "final_term": item["final_term"],
+            "assignment": item["assignment"],
+            "total": total,
+            "grade": grade
+        } for item, total, grade in zip(items, totals, grades)
+    ]
+
+    now = datetime.now()
+    changes = []
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        chunk = rows[start:start + UPSERT_CHUNK_SIZE]
+        # Current state of the pairs that already exist, so the rollups can move by the difference
+        old = {
+            (r[0], r[1]): analytics.mark_facts(*r)
+            for r in db.execute(select(*analytics.FACT_COLUMNS).where(
+                tuple_(Marks.student_id, Marks.subject_id).in_([(r["student_id"], r["subject_id"]) for r in chunk])
+            ))
+        }
+        for row in chunk:
+            # created_at is not in update_columns, so updated rows keep their month
+            row["created_at"] = now
+            before = old.get((row["student_id"], row["subject_id"]))
+            changes.append((before, analytics.MarkFacts(
+                row["student_id"], row["subject_id"], row["total"], row["grade"],
+                before.month if before else now.month
+            )))
+        upsert(
+            db, Marks.__table__, chunk,
+            keys=["student_id", "subject_id"],
+            update_columns=["mid_term", "final_term", "assignment", "total", "grade"]
+        )
+    analytics.apply_changes(db, school_id, changes)
+    return len(rows)
@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+# In-process metrics in the Prometheus text format, served at /metrics. Each
+# worker process keeps its own numbers (scrape every worker, or run one).
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Seconds; request latencies span cached 304s to report-card zips
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Pool checkouts are normally microseconds; the tail is waiting for a free connection
+CHECKOUT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        # One bisect and a few increments under the lock: cheap enough per request
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self) -> list:
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, counts, total in sorted(snapshot):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _number(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+class Gauge:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: int = 1):
+        with self._lock:
+            self.value -= amount
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {_number(self.value)}"]
+
+requests_in_flight = Gauge("http_requests_in_flight", "Requests currently being handled")
+request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency by route template, method and status",
+    ("method", "route", "status")
+)
+operation_duration = Histogram(
+    "app_operation_duration_seconds", "Time spent in named operations (ML calls, password hashing)",
+    ("operation",)
+)
+pool_checkout_duration = Histogram(
+    "db_pool_checkout_duration_seconds", "Time to get a connection from the pool, including waiting",
+    ("engine",), CHECKOUT_BUCKETS
+)
+_metrics = [requests_in_flight, request_duration, operation_duration, pool_checkout_duration]
+
+# Callables run at scrape time, each returning [(name, type, help, [(labels dict, value)])]
+_collectors = []
+
+def register_collector(collector):
+    _collectors.append(collector)
+
+@contextmanager
+def timer(operation: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        operation_duration.observe(time.perf_counter() - start, operation)
+
+def timed(operation: str):
+    """Decorator form of timer() for plain functions."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(operation):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def instrument_pool(name: str, engine):
+    """Time every checkout from `engine`'s pool (sync engines; pass async_engine.sync_engine)."""
+    pool = engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            pool_checkout_duration.observe(time.perf_counter() - start, name)
+
+    pool.connect = timed_connect
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines += metric.render()
+    for collector in _collectors:
+        for name, kind, help, samples in collector():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                if value is not None:
+                    lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+def route_template(scope) -> str:
+    """Full path template of the matched route, e.g. /api/marks/student/{student_id}."""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    # Routes of included routers may carry only their own part of the path; the
+    # router prefix is whatever precedes that part in the concrete request path
+    try:
+        concrete = route.path_format.format(**scope.get("path_params", {}))
+    except (AttributeError, KeyError, IndexError, ValueError):
+        return template
+    path = scope["path"]
+    if concrete and path.endswith(concrete):
+        return path[:len(path) - len(concrete)] + template
+    return template
+
+class MetricsMiddleware:
+    """Plain ASGI middleware recording latency per route template.
+
+    The route label is the matched path template (e.g. /api/marks/student/{student_id}),
+    so ids never become label values; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+
+        status = 500
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            requests_in_flight.dec()
+            request_duration.observe(time.perf_counter() - start, scope["method"], route_template(scope), str(status))
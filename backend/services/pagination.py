@@ -0,0 +1,67 @@
+import os
+from collections import namedtuple
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+# Label of the sort key column added to paginated selects
+KEY_LABEL = "_page_key"
+
+PageParams = namedtuple("PageParams", ["limit", "cursor", "include_total"])
+
+def page_params(
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    include_total: bool = False
+) -> PageParams:
+    """Query parameters shared by the list/report endpoints.
+
+    Without `limit` the whole list comes back as before. With it, rows come in
+    key order and the X-Next-Cursor header holds the `cursor` for the next
+    page (absent on the last one). include_total=true adds X-Total-Count.
+    """
+    if cursor is not None:
+        try:
+            cursor = int(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return PageParams(limit, cursor, include_total)
+
+def _page_query(stmt, key, page: PageParams):
+    # The key is a unique integer id, so "after the last row seen" is a plain
+    # range seek on its index no matter how deep the page is
+    stmt = stmt.add_columns(key.label(KEY_LABEL)).order_by(key)
+    if page.cursor is not None:
+        stmt = stmt.where(key > page.cursor)
+    if page.limit:
+        stmt = stmt.limit(page.limit + 1)
+    return stmt
+
+def _finish_page(response: Response, rows: list, page: PageParams) -> list:
+    if page.limit and len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers["X-Next-Cursor"] = str(getattr(rows[-1], KEY_LABEL))
+    return rows
+
+def _count_query(stmt):
+    return select(func.count()).select_from(stmt.order_by(None).subquery())
+
+def paginate(db: Session, response: Response, stmt, key, page: PageParams) -> list:
+    """Run `stmt` for one page ordered by `key` (a unique integer column)."""
+    if page.include_total:
+        response.headers["X-Total-Count"] = str(db.scalar(_count_query(stmt)))
+    return _finish_page(response, db.execute(_page_query(stmt, key, page)).all(), page)
+
+async def apaginate(db: AsyncSession, response: Response, stmt, key, page: PageParams) -> list:
+    if page.include_total:
+        response.headers["X-Total-Count"] = str(await db.scalar(_count_query(stmt)))
+    return _finish_page(response, (await db.execute(_page_query(stmt, key, page))).all(), page)
+
+def as_dict(row) -> dict:
+    """Row._asdict() without the sort key column."""
+    data = row._asdict()
+    data.pop(KEY_LABEL, None)
+    return data
@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.user import User
+from models.school import School
+from models.teacher import Teacher
+from models.student import Student
+from models.subject import Subject
+from models.marks import Marks
+
+REPORT_CARD_WORKERS = int(os.getenv("REPORT_CARD_WORKERS", str(os.cpu_count() or 2)))
+# Rendered PDFs kept per worker process, by total size
+REPORT_CARD_CACHE_BYTES = int(os.getenv("REPORT_CARD_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+async def load_cards(db: AsyncSession, *criteria) -> list:
+    """Report card data for every student matching `criteria`, in one query.
+
+    Each card has the shape /student/my-report-pdf has always returned, plus
+    the student's id for file names.
+    """
+    rows = (await db.execute(select(
+        Student.id,
+        Student.name,
+        Student.class_name,
+        User.name.label("teacher"),
+        School.name.label("school"),
+        Subject.name.label("subject"),
+        Marks.mid_term,
+        Marks.final_term,
+        Marks.assignment,
+        Marks.total,
+        Marks.grade
+    ).outerjoin(School, Student.school_id == School.id)\
+     .outerjoin(Teacher, Student.teacher_id == Teacher.id)\
+     .outerjoin(User, Teacher.user_id == User.id)\
+     .outerjoin(Marks, Student.id == Marks.student_id)\
+     .outerjoin(Subject, Marks.subject_id == Subject.id)\
+     .where(*criteria)\
+     .order_by(Student.id, Marks.id))).all()
+
+    cards = {}
+    for r in rows:
+        card = cards.get(r.id)
+        if card is None:
+            card = cards[r.id] = {
+                "student_id": r.id,
+                "student_name": r.name,
+                "class": r.class_name,
+                "teacher": r.teacher or "Unknown",
+                "school": r.school or "Unknown",
+                "results": []
+            }
+        if r.subject is not None:
+            card["results"].append({
+                "subject": r.subject,
+                "mid_term": float(r.mid_term),
+                "final_term": float(r.final_term),
+                "assignment": float(r.assignment),
+                "total": float(r.total) if r.total is not None else float(r.mid_term + r.final_term + r.assignment),
+                "grade": r.grade
+            })
+    return list(cards.values())
+
+def render_report_card(card: dict) -> bytes:
+    """One A4 report card as PDF bytes (runs in the render pool)."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from xml.sax.saxutils import escape
+
+    styles = getSampleStyleSheet()
+    blue = colors.HexColor("#3B82F6")
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, title=f"{card['student_name']} Report Card")
+
+    story = [
+        Paragraph("ACADEMIC PROGRESS REPORT", styles["Title"]),
+        Paragraph(f"<b>Student:</b> {escape(card['student_name'])}", styles["Normal"]),
+        Paragraph(f"<b>Class:</b> {escape(card['class'] or '-')}", styles["Normal"]),
+        Paragraph(f"<b>Teacher:</b> {escape(card['teacher'])}", styles["Normal"]),
+        Paragraph(f"<b>School:</b> {escape(card['school'])}", styles["Normal"]),
+        Spacer(1, 16)
+    ]
+
+    table = [["Subject", "Mid Term", "Final Term", "Assignment", "Total", "Grade"]]
+    for r in card["results"]:
+        table.append([r["subject"], f"{r['mid_term']:g}", f"{r['final_term']:g}", f"{r['assignment']:g}", f"{r['total']:g}", r["grade"] or "-"])
+    grid = Table(table, repeatRows=1)
+    grid.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), blue),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#EFF6FF")]),
+        ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#BFDBFE")),
+        ("ALIGN", (1, 0), (-1, -1), "CENTER")
+    ]))
+    story.append(grid)
+
+    if card["results"]:
+        average = sum(r["total"] for r in card["results"]) / len(card["results"])
+        story += [Spacer(1, 16), Paragraph(f"<b>Average:</b> {average:.2f}", styles["Normal"])]
+    else:
+        story += [Spacer(1, 16), Paragraph("No marks recorded yet.", styles["Normal"])]
+
+    doc.build(story)
+    return buffer.getvalue()
+
+def render_report_cards(cards: list) -> list:
+    return [render_report_card(card) for card in cards]
+
+def card_key(card: dict) -> str:
+    # Hash of everything printed: any marks change (or rename) gives a new key
+    return hashlib.sha256(json.dumps(card, sort_keys=True).encode()).hexdigest()
+
+class PdfCache:
+    """Thread-safe LRU of rendered PDFs, bounded by total bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            pdf = self._data.get(key)
+            if pdf is not None:
+                self._data.move_to_end(key)
+            return pdf
+
+    def set(self, key: str, pdf: bytes):
+        with self._lock:
+            if key in self._data:
+                self.size -= len(self._data.pop(key))
+            self._data[key] = pdf
+            self.size += len(pdf)
+            while self.size > self.max_bytes and self._data:
+                self.size -= len(self._data.popitem(last=False)[1])
+
+pdf_cache = PdfCache(REPORT_CARD_CACHE_BYTES)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _executor():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=REPORT_CARD_WORKERS)
+    return _pool
+
+async def render(cards: list) -> list:
+    """PDF bytes for each card, from the cache or rendered in the process pool."""
+    keys = [card_key(card) for card in cards]
+    pdfs = [pdf_cache.get(key) for key in keys]
+    missing = [i for i, pdf in enumerate(pdfs) if pdf is None]
+    if missing:
+        # A few slices per worker keeps every process busy without per-card IPC
+        size = max(1, -(-len(missing) // (REPORT_CARD_WORKERS * 4)))
+        slices = [missing[i:i + size] for i in range(0, len(missing), size)]
+        rendered = await asyncio.gather(*[
+            asyncio.wrap_future(_executor().submit(render_report_cards, [cards[i] for i in s]))
+            for s in slices
+        ])
+        for s, results in zip(slices, rendered):
+            for i, pdf in zip(s, results):
+                pdfs[i] = pdf
+                pdf_cache.set(keys[i], pdf)
+    return pdfs
+
+def file_name(card: dict) -> str:
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", card["student_name"]).strip("_") or "student"
+    return f"{name}_{card['student_id']}.pdf"
+
+def _zip(cards: list, pdfs: list) -> bytes:
+    buffer = io.BytesIO()
+    # PDFs are already compressed, so store them as-is
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for card, pdf in zip(cards, pdfs):
+            folder = re.sub(r"[^A-Za-z0-9._-]+", "_", card["class"] or "unassigned")
+            archive.writestr(f"{folder}/{file_name(card)}", pdf)
+    return buffer.getvalue()
+
+async def render_zip(cards: list) -> bytes:
+    """All cards rendered into one zip, one folder per class."""
+    pdfs = await render(cards)
+    return await asyncio.to_thread(_zip, cards, pdfs)
@@ -0,0 +1,97 @@
+from sqlalchemy import select, insert
+from sqlalchemy.orm import Session
+from models.user import User, RoleEnum
+from models.student import Student
+from auth.jwt_handler import password_hasher
+from services import school_stats
+
+STUDENT_EMAIL_DOMAIN = "school.com"
+
+def student_email_prefix(name: str) -> str:
+    return name.lower().replace(" ", "")
+
+def allocate_student_emails(db: Session, names: list, reserved: set | None = None) -> list:
+    """Pick a free login email per name with set-based lookups.
+
+    Tries `<prefix>@school.com` first, then `<prefix>1@`, `<prefix>2@`, ... for
+    collisions. Each round checks a window of candidates for every unresolved
+    prefix with one IN query on the unique email index, doubling the window
+    when it runs out, so a batch resolves in a handful of queries. `reserved`
+    carries emails already handed out earlier in the same import.
+    """
+    reserved = reserved if reserved is not None else set()
+    emails = [None] * len(names)
+
+    waiting = {}
+    for i, name in enumerate(names):
+        waiting.setdefault(student_email_prefix(name), []).append(i)
+    next_suffix = {prefix: 0 for prefix in waiting}
+    window = {prefix: len(idxs) for prefix, idxs in waiting.items()}
+
+    while waiting:
+        candidates = {}
+        for prefix in waiting:
+            start = next_suffix[prefix]
+            candidates[prefix] = [
+                f"{prefix if n == 0 else f'{prefix}{n}'}@{STUDENT_EMAIL_DOMAIN}"
+                for n in range(start, start + window[prefix])
+            ]
+            next_suffix[prefix] = start + window[prefix]
+            window[prefix] *= 2
+
+        all_candidates = [e for group in candidates.values() for e in group]
+        taken = set(db.scalars(select(User.email).where(User.email.in_(all_candidates))))
+
+        for prefix, group in candidates.items():
+            free = iter([e for e in group if e not in taken and e not in reserved])
+            idxs = waiting[prefix]
+            while idxs:
+                email = next(free, None)
+                if email is None:
+                    break
+                emails[idxs.pop(0)] = email
+                reserved.add(email)
+        waiting = {prefix: idxs for prefix, idxs in waiting.items() if idxs}
+
+    return emails
+
+def create_students(db: Session, rows: list, teacher_id: int, school_id: int, reserved: set | None = None) -> list:
+    """Bulk-create student users for one chunk of rows.
+
+    rows: dicts with name, age, gender, class_name. The initial password is the
+    student's name. Returns the login credentials in row order; the caller commits.
+    """
+    if not rows:
+        return []
+
+    names = [r["name"] for r in rows]
+    emails = allocate_student_emails(db, names, reserved)
+    hashes = password_hasher.hash_many(names)
+
+    db.execute(insert(User), [
+        {
+            "name": name,
+            "email": email,
+            "password_hash": pw_hash,
+            "role": RoleEnum.student,
+            "school_id": school_id,
+            "is_active": True,
+            "is_default_password": True
+        } for name, email, pw_hash in zip(names, emails, hashes)
+    ])
+    user_ids = dict(db.execute(select(User.email, User.id).where(User.email.in_(emails))).all())
+
+    db.execute(insert(Student), [
+        {
+            "user_id": user_ids[email],
+            "teacher_id": teacher_id,
+            "school_id": school_id,
+            "name": r["name"],
+            "age": r.get("age"),
+            "gender": r.get("gender"),
+            "class_name": r.get("class_name")
+        } for r, email in zip(rows, emails)
+    ])
+    school_stats.bump(db, school_id, students=len(rows))
+
+    return [{"name": name, "email": email, "password": name} for name, email in zip(names, emails)]
@@ -0,0 +1,68 @@
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from models.school import School
+from models.school_stats import SchoolStats
+from models.teacher import Teacher
+from models.student import Student
+from models.marks import Marks
+from services.sql import upsert
+
+COUNT_COLUMNS = ["teacher_count", "student_count", "mark_count"]
+
+def bump(db: Session, school_id: int, teachers: int = 0, students: int = 0, marks: int = 0):
+    """Add count deltas for one school and bump its data_version; runs in the caller's transaction.
+
+    A single atomic INSERT ... ON DUPLICATE KEY UPDATE col = col + delta, so
+    concurrent writers never lose each other's increments. Call it on every
+    roster/marks write, even with no count change, so cached analytics for
+    the school are rebuilt.
+    """
+    upsert(
+        db, SchoolStats.__table__,
+        [{"school_id": school_id, "teacher_count": teachers, "student_count": students, "mark_count": marks, "data_version": 1}],
+        keys=["school_id"],
+        increment_columns=COUNT_COLUMNS + ["data_version"]
+    )
+
+def reconcile(db: Session, school_id: int | None = None) -> list:
+    """Recount schools from the source tables and rewrite rows that drifted.
+
+    Returns one dict per corrected school; the caller commits.
+    """
+    # Lock the counters first so writers wait and the recount below sees every
+    # write that committed before it (InnoDB snapshots on the first plain read)
+    locked = select(SchoolStats).with_for_update()
+    if school_id is not None:
+        locked = locked.where(SchoolStats.school_id == school_id)
+    current = {s.school_id: s for s in db.scalars(locked)}
+
+    def counts(model):
+        query = select(model.school_id, func.count()).group_by(model.school_id)
+        if school_id is not None:
+            query = query.where(model.school_id == school_id)
+        return dict(db.execute(query).all())
+
+    teachers, students, marks = counts(Teacher), counts(Student), counts(Marks)
+    school_ids = select(School.id)
+    if school_id is not None:
+        school_ids = school_ids.where(School.id == school_id)
+
+    rows = []
+    drift = []
+    for sid in db.scalars(school_ids):
+        row = {
+            "school_id": sid,
+            "teacher_count": teachers.get(sid, 0),
+            "student_count": students.get(sid, 0),
+            "mark_count": marks.get(sid, 0),
+            "data_version": 1
+        }
+        stats = current.get(sid)
+        before = {c: getattr(stats, c) for c in COUNT_COLUMNS} if stats else None
+        after = {c: row[c] for c in COUNT_COLUMNS}
+        if before != after:
+            rows.append(row)
+            drift.append({"school_id": sid, "before": before, "after": after})
+
+    upsert(db, SchoolStats.__table__, rows, keys=["school_id"], update_columns=COUNT_COLUMNS, increment_columns=["data_version"])
+    return drift
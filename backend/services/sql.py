@@ -0,0 +1,34 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+def upsert_stmt(dialect: str, table, rows: list, keys: list, update_columns: list = (), increment_columns: list = ()):
+    """Multi-row INSERT that updates `update_columns` when `keys` already exist.
+
+    `increment_columns` are added to the existing value instead of replacing
+    it, as one atomic statement. MySQL gets INSERT ... ON DUPLICATE KEY UPDATE;
+    SQLite (local runs and tests) gets the equivalent INSERT ... ON CONFLICT
+    DO UPDATE.
+    """
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(rows)
+        values = {c: stmt.inserted[c] for c in update_columns}
+        values.update({c: table.c[c] + stmt.inserted[c] for c in increment_columns})
+        return stmt.on_duplicate_key_update(values)
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(rows)
+        values = {c: stmt.excluded[c] for c in update_columns}
+        values.update({c: table.c[c] + stmt.excluded[c] for c in increment_columns})
+        return stmt.on_conflict_do_update(index_elements=keys, set_=values)
+    raise NotImplementedError(f"upsert is not implemented for {dialect}")
+
+def upsert(db: Session, table, rows: list, keys: list, update_columns: list = (), increment_columns: list = ()):
+    if not rows:
+        return
+    db.execute(upsert_stmt(db.get_bind().dialect.name, table, rows, keys, update_columns, increment_columns))
+
+async def aupsert(db: AsyncSession, table, rows: list, keys: list, update_columns: list = (), increment_columns: list = ()):
+    if not rows:
+        return
+    await db.execute(upsert_stmt(db.bind.dialect.name, table, rows, keys, update_columns, increment_columns))
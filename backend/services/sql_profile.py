@@ -0,0 +1,159 @@
+import contextvars
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import Counter
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+SQL_PROFILE = os.getenv("SQL_PROFILE", "1") == "1"
+# Adds X-DB-Query-Count / X-DB-Time-Ms (and X-DB-Repeated-Queries) to responses
+SQL_DEBUG_HEADERS = os.getenv("SQL_DEBUG_HEADERS", "0") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Bound parameters of slow SELECTs in the log (dev only: they can hold emails);
+# parameters of writes (password hashes, roster rows) are never logged
+SLOW_QUERY_LOG_PARAMS = os.getenv("SLOW_QUERY_LOG_PARAMS", "0") == "1"
+# The same statement shape this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+class RequestQueries:
+    """SQL statements run on behalf of one request."""
+
+    __slots__ = ("count", "seconds", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> list:
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+# The context follows a request into threadpool routes and SQLAlchemy's async
+# greenlets, so statements from either kind of route land on the right request
+_current = contextvars.ContextVar("sql_profile_current", default=None)
+
+# Expanded IN lists differ in length only; collapse them so they share a shape
+_IN_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)")
+# One VALUES group per row in multi-row inserts/upserts
+_VALUES = re.compile(r"(VALUES\s*\(\?\)|VALUES\s*\([^)]*\))(\s*,\s*\([^)]*\))+", re.IGNORECASE)
+
+def statement_shape(statement: str) -> str:
+    shape = _IN_LIST.sub("(?)", " ".join(statement.split()))
+    return _VALUES.sub(r"\1", shape)
+
+# Start times live on the execution context, so a failed statement leaves nothing behind
+def _before(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._sql_profile_start = time.perf_counter()
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_sql_profile_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    stats = _current.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+        stats.shapes[statement_shape(statement)] += 1
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        _slow_query(conn.engine, statement, parameters, elapsed)
+
+# Slow statements are EXPLAINed on a background thread with the sync engine
+# for the same database, never on the request's own connection
+_explain_queue = queue.Queue(maxsize=100)
+_explain_engines = {}
+_explain_thread = None
+_explain_lock = threading.Lock()
+
+def _slow_query(engine, statement, parameters, elapsed):
+    is_select = statement.lstrip().upper().startswith("SELECT")
+    if is_select and SLOW_QUERY_LOG_PARAMS:
+        logger.warning("Slow query (%.0f ms): %s | params=%.500r", elapsed * 1000, " ".join(statement.split()), parameters)
+    else:
+        logger.warning("Slow query (%.0f ms): %s", elapsed * 1000, " ".join(statement.split()))
+    if not is_select:
+        return
+    explain_engine = _explain_engines.get(engine)
+    if explain_engine is None:
+        return
+    _start_explainer()
+    try:
+        _explain_queue.put_nowait((explain_engine, statement, parameters))
+    except queue.Full:
+        pass
+
+def _start_explainer():
+    global _explain_thread
+    if _explain_thread is None:
+        with _explain_lock:
+            if _explain_thread is None:
+                _explain_thread = threading.Thread(target=_explain_worker, name="sql-explain", daemon=True)
+                _explain_thread.start()
+
+def _explain_worker():
+    while True:
+        explain_engine, statement, parameters = _explain_queue.get()
+        prefix = "EXPLAIN " if explain_engine.dialect.name == "mysql" else "EXPLAIN QUERY PLAN "
+        try:
+            with explain_engine.connect() as conn:
+                plan = conn.exec_driver_sql(prefix + statement, parameters).all()
+            logger.warning("EXPLAIN for slow query: %s\n%s", " ".join(statement.split())[:200],
+                           "\n".join("  " + " | ".join(str(v) for v in row) for row in plan))
+        except Exception:
+            logger.exception("EXPLAIN failed for slow query")
+
+def instrument(engines: dict):
+    """Attach the statement hooks to each engine.
+
+    `engines` maps sync engines (pass async_engine.sync_engine for async ones)
+    to the sync engine that can EXPLAIN their statements (often the same one).
+    """
+    for engine, explain_engine in engines.items():
+        event.listen(engine, "before_cursor_execute", _before)
+        event.listen(engine, "after_cursor_execute", _after)
+        if explain_engine is not None:
+            _explain_engines[engine] = explain_engine
+
+class SqlProfileMiddleware:
+    """Plain ASGI middleware giving each request its own RequestQueries.
+
+    Logs repeated statement shapes (likely N+1 loops) once the response is
+    done and, with SQL_DEBUG_HEADERS=1, reports the counts in response headers.
+    Headers can only cover statements run before the response starts, so a
+    streamed body's queries show up in the log but not the headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SQL_PROFILE:
+            return await self.app(scope, receive, send)
+
+        stats = RequestQueries()
+        token = _current.set(stats)
+
+        async def send_wrapper(message):
+            if SQL_DEBUG_HEADERS and message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.count).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.seconds * 1000:.1f}".encode()))
+                repeated = stats.repeated()
+                if repeated:
+                    headers.append((b"x-db-repeated-queries", str(sum(n for _, n in repeated)).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            for shape, n in stats.repeated():
+                logger.warning("Possible N+1: %s %s ran the same statement %d times: %s",
+                               scope["method"], scope["path"], n, shape[:300])
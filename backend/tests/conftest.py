@@ -0,0 +1,33 @@
+import os
+import tempfile
+import pytest
+
+# Tests get their own SQLite file, never the configured DATABASE_URL
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+for name in ("ASYNC_DATABASE_URL", "READ_DATABASE_URL", "ASYNC_READ_DATABASE_URL"):
+    os.environ.pop(name, None)
+
+from database import Base, engine, SessionLocal
+from models import user, student, marks, school, teacher, subject, school_stats, student_mark_stats, school_mark_rollup, school_analytics
+
+@pytest.fixture
+def db():
+    """A session on freshly created tables."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    yield session
+    session.close()
+
+@pytest.fixture
+def school_id(db):
+    """School 1 with students 1-3 and subjects 1-2."""
+    db.add(school.School(id=1, name="Test School"))
+    for i in (1, 2, 3):
+        db.add(user.User(id=i, name=f"Student {i}", email=f"s{i}@test.edu", password_hash="x",
+                         role=user.RoleEnum.student, school_id=1))
+        db.add(student.Student(id=i, user_id=i, school_id=1, name=f"Student {i}"))
+    for i in (1, 2):
+        db.add(subject.Subject(id=i, name=f"Subject {i}", school_id=1))
+    db.commit()
+    return 1
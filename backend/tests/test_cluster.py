@@ -0,0 +1,64 @@
+import itertools
+import numpy as np
+import pytest
+from ml.cluster import _optimal_centers, fit_tiers, classify_total
+
+def _cost(values, centers):
+    # Every value to its nearest centre, the assignment fit_tiers uses
+    return float(((values[:, None] - np.asarray(centers)[None, :]) ** 2).min(axis=1).sum())
+
+def _brute_force_cost(values, k):
+    # Optimal 1-D k-means clusters are contiguous runs of the sorted values
+    x = np.sort(values)
+    best = np.inf
+    for cuts in itertools.combinations(range(1, len(x)), k - 1):
+        groups = np.split(x, cuts)
+        best = min(best, sum(float(((g - g.mean()) ** 2).sum()) for g in groups))
+    return best
+
+@pytest.mark.parametrize("seed", range(40))
+def test_optimal_centers_match_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    values = rng.uniform(0, 100, rng.integers(3, 11)).round(2)
+    for k in (2, 3):
+        if k > len(np.unique(values)):
+            continue
+        assert _cost(values, _optimal_centers(values, k)) == pytest.approx(_brute_force_cost(values, k), abs=1e-6)
+
+@pytest.mark.parametrize("values", [
+    [1, 1, 2, 2, 3, 3],
+    [0, 1, 2, 3],
+    [10, 20, 30, 40, 50, 60],
+    [5, 5, 5, 6, 9, 9, 9],
+])
+def test_optimal_centers_ties(values):
+    values = np.array(values, dtype=np.float64)
+    for k in (2, 3):
+        centers = _optimal_centers(values, k)
+        assert _cost(values, centers) == pytest.approx(_brute_force_cost(values, k), abs=1e-9)
+        # Equal-cost partitions are broken the same way whatever the input order
+        np.testing.assert_array_equal(_optimal_centers(values[::-1].copy(), k), centers)
+
+def test_identical_totals_share_a_tier():
+    labels, model = fit_tiers([40, 40, 40, 75, 75, 95])
+    assert labels[:3] == ["Low"] * 3
+    assert labels[3] == labels[4]
+    assert len(set(labels)) == 3
+
+def test_fewer_totals_than_tiers():
+    assert fit_tiers([]) == ([], ([], []))
+    labels, model = fit_tiers([70])
+    assert labels == ["Medium"] and model.thresholds == []
+    labels, model = fit_tiers([40, 90])
+    assert labels == ["Low", "High"]
+    assert classify_total(60, model) == "Low" and classify_total(70, model) == "High"
+
+def test_all_equal_totals():
+    labels, model = fit_tiers([55.5] * 10)
+    assert labels == ["Medium"] * 10
+    assert model.thresholds == []
+    assert classify_total(0, model) == "Medium"
+
+def test_exact_matches_kmeans_on_separated_data():
+    totals = [20, 21, 22, 55, 56, 57, 90, 91, 92]
+    assert fit_tiers(totals, backend="exact")[0] == fit_tiers(totals, backend="kmeans")[0]
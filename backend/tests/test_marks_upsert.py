@@ -0,0 +1,74 @@
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql, sqlite
+from models.marks import Marks
+from models.school_stats import SchoolStats
+from models.student_mark_stats import StudentMarkStats
+from models.school_mark_rollup import SchoolMarkRollup
+from services.marks import upsert_marks
+from services.sql import upsert_stmt
+
+def _mark(student_id, subject_id, mid_term, final_term, assignment):
+    return {"student_id": student_id, "subject_id": subject_id,
+            "mid_term": mid_term, "final_term": final_term, "assignment": assignment}
+
+def _rollups(db, school_id):
+    return {
+        (r.dimension, r.key): (r.mark_count, float(r.total_sum))
+        for r in db.scalars(select(SchoolMarkRollup).where(SchoolMarkRollup.school_id == school_id))
+        if r.mark_count
+    }
+
+def test_upsert_stmt_dialects():
+    rows = [{"student_id": 1, "subject_id": 1, "school_id": 1, "total": 50}]
+    stmt = upsert_stmt("mysql", Marks.__table__, rows, ["student_id", "subject_id"], ["total"])
+    assert "ON DUPLICATE KEY UPDATE total = VALUES(total)" in str(stmt.compile(dialect=mysql.dialect()))
+    stmt = upsert_stmt("sqlite", Marks.__table__, rows, ["student_id", "subject_id"], ["total"])
+    assert "ON CONFLICT (student_id, subject_id) DO UPDATE SET total = excluded.total" in str(stmt.compile(dialect=sqlite.dialect()))
+
+def test_insert_then_update_same_pair(db, school_id):
+    assert upsert_marks(db, school_id, [_mark(1, 1, 30, 40, 15)]) == 1
+    db.commit()
+    first = db.scalars(select(Marks)).one()
+    assert (float(first.total), first.grade) == (85.0, "A")
+    created_at = first.created_at
+
+    assert upsert_marks(db, school_id, [_mark(1, 1, 20, 30, 10)]) == 1
+    db.commit()
+    db.expire_all()
+    row = db.scalars(select(Marks)).one()
+    assert row.id == first.id
+    assert (float(row.mid_term), float(row.total), row.grade) == (20.0, 60.0, "C")
+    assert row.created_at == created_at
+
+    stats = db.get(SchoolStats, school_id)
+    # An update is not a new mark, but both writes bump the version
+    assert (stats.mark_count, stats.data_version) == (1, 2)
+
+def test_last_item_wins_within_a_batch(db, school_id):
+    assert upsert_marks(db, school_id, [_mark(1, 1, 10, 10, 10), _mark(1, 1, 40, 45, 10)]) == 1
+    db.commit()
+    row = db.scalars(select(Marks)).one()
+    assert (float(row.total), row.grade) == (95.0, "A+")
+
+def test_rollup_deltas(db, school_id):
+    upsert_marks(db, school_id, [_mark(1, 1, 30, 40, 15), _mark(1, 2, 20, 25, 10), _mark(2, 1, 40, 45, 10)])
+    db.commit()
+    month = str(db.scalars(select(Marks.created_at)).first().month)
+    assert _rollups(db, school_id) == {
+        ("grade", "A"): (1, 85.0), ("grade", "D"): (1, 55.0), ("grade", "A+"): (1, 95.0),
+        ("subject", "1"): (2, 180.0), ("subject", "2"): (1, 55.0),
+        ("month", month): (3, 235.0),
+    }
+
+    # Student 1's subject 2 moves from D to B; student 2 is untouched
+    upsert_marks(db, school_id, [_mark(1, 2, 30, 35, 10)])
+    db.commit()
+    db.expire_all()
+    assert _rollups(db, school_id) == {
+        ("grade", "A"): (1, 85.0), ("grade", "B"): (1, 75.0), ("grade", "A+"): (1, 95.0),
+        ("subject", "1"): (2, 180.0), ("subject", "2"): (1, 75.0),
+        ("month", month): (3, 255.0),
+    }
+    students = {s.student_id: (s.mark_count, float(s.total_sum), s.data_version) for s in db.scalars(select(StudentMarkStats))}
+    assert students == {1: (2, 160.0, 2), 2: (1, 95.0, 1)}
+    assert db.get(SchoolStats, school_id).mark_count == 3
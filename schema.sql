@@ -1,5 +1,9 @@
 -- Drop existing tables to start fresh with Multi-Tenant Architecture
 SET FOREIGN_KEY_CHECKS = 0;
+DROP TABLE IF EXISTS school_analytics;
+DROP TABLE IF EXISTS school_mark_rollups;
+DROP TABLE IF EXISTS student_mark_stats;
+DROP TABLE IF EXISTS school_stats;
 DROP TABLE IF EXISTS marks;
 DROP TABLE IF EXISTS students;
 DROP TABLE IF EXISTS teachers;
@@ -53,6 +57,7 @@ CREATE TABLE students (
     age INT,
     gender ENUM('Male', 'Female', 'Non-binary', 'Other'),
     class VARCHAR(20),
+    KEY ix_students_school_teacher (school_id, teacher_id),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (teacher_id) REFERENCES teachers(id) ON DELETE SET NULL,
     FOREIGN KEY (school_id) REFERENCES schools(id) ON DELETE CASCADE
@@ -78,11 +83,55 @@ CREATE TABLE marks (
     assignment DECIMAL(5, 2) DEFAULT 0,
     total DECIMAL(5, 2) GENERATED ALWAYS AS (mid_term + final_term + assignment) STORED,
     grade VARCHAR(2),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_marks_student_subject (student_id, subject_id),
+    KEY ix_marks_school_student (school_id, student_id),
     FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
     FOREIGN KEY (subject_id) REFERENCES subjects(id) ON DELETE CASCADE,
     FOREIGN KEY (school_id) REFERENCES schools(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- 7. School Stats Table (per-school counts, maintained by the API on every write)
+CREATE TABLE school_stats (
+    school_id INT PRIMARY KEY,
+    teacher_count INT NOT NULL DEFAULT 0,
+    student_count INT NOT NULL DEFAULT 0,
+    mark_count INT NOT NULL DEFAULT 0,
+    data_version BIGINT NOT NULL DEFAULT 0,
+    FOREIGN KEY (school_id) REFERENCES schools(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 8. Analytics rollups (running count/sum of marks totals, maintained by the API on every marks write)
+CREATE TABLE student_mark_stats (
+    student_id INT PRIMARY KEY,
+    school_id INT NOT NULL,
+    mark_count INT NOT NULL DEFAULT 0,
+    total_sum DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    data_version BIGINT NOT NULL DEFAULT 0,
+    KEY ix_student_mark_stats_school_id (school_id),
+    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+    FOREIGN KEY (school_id) REFERENCES schools(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE school_mark_rollups (
+    school_id INT NOT NULL,
+    dimension VARCHAR(16) NOT NULL,
+    `key` VARCHAR(32) NOT NULL,
+    mark_count INT NOT NULL DEFAULT 0,
+    total_sum DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (school_id, dimension, `key`),
+    FOREIGN KEY (school_id) REFERENCES schools(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 9. Cached dashboard/insights payload, rebuilt when school_stats.data_version moves
+CREATE TABLE school_analytics (
+    school_id INT PRIMARY KEY,
+    data_version BIGINT NOT NULL,
+    payload JSON NOT NULL,
+    built_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (school_id) REFERENCES schools(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- ==========================================
 -- SEED DATA
 -- ==========================================
@@ -167,5 +216,24 @@ INSERT INTO marks (student_id, subject_id, school_id, mid_term, final_term, assi
 (9, 1, 1, 45, 49, 5, 'A+'), (9, 2, 1, 42, 46, 8, 'A+'), (9, 3, 1, 40, 45, 10, 'A+'),
 (10, 1, 1, 10, 15, 5, 'F'), (10, 2, 1, 12, 20, 8, 'F'), (10, 3, 1, 15, 18, 10, 'F');
 
+-- 10. School Stats for the seeded rows
+INSERT INTO school_stats (school_id, teacher_count, student_count, mark_count)
+SELECT s.id,
+    (SELECT COUNT(*) FROM teachers t WHERE t.school_id = s.id),
+    (SELECT COUNT(*) FROM students st WHERE st.school_id = s.id),
+    (SELECT COUNT(*) FROM marks m WHERE m.school_id = s.id)
+FROM schools s;
+
+-- 11. Analytics rollups for the seeded marks
+INSERT INTO student_mark_stats (student_id, school_id, mark_count, total_sum)
+SELECT student_id, school_id, COUNT(*), SUM(total) FROM marks GROUP BY student_id, school_id;
+
+INSERT INTO school_mark_rollups (school_id, dimension, `key`, mark_count, total_sum)
+SELECT school_id, 'grade', COALESCE(grade, ''), COUNT(*), SUM(total) FROM marks GROUP BY school_id, grade
+UNION ALL
+SELECT school_id, 'subject', subject_id, COUNT(*), SUM(total) FROM marks GROUP BY school_id, subject_id
+UNION ALL
+SELECT school_id, 'month', COALESCE(MONTH(created_at), ''), COUNT(*), SUM(total) FROM marks GROUP BY school_id, MONTH(created_at);
+
 -- Finalize Metadata Foreign Keys
 ALTER TABLE schools ADD CONSTRAINT fk_schools_created_by FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL;